@@ -0,0 +1,130 @@
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+
+class LineageCache:
+    """
+    血缘解析结果缓存
+
+    以 (类型, 方言, 规范化后的语句文本) 的哈希值作为键，内存中为有界的 LRU，
+    可选的 SQLite 文件在多次运行之间保留结果。缓存值以 JSON 保存，每次读取都返回新的对象。
+    """
+
+    def __init__(self, maxsize: int = 10000, path: str | Path | None = None, commit_interval: int = 1000) -> None:
+        """
+        Args:
+            maxsize: 内存中最多缓存的条数
+            path: SQLite 缓存文件路径，为空时只使用内存缓存
+            commit_interval: 每写入多少条提交一次 SQLite 事务
+        """
+        self.maxsize = maxsize
+        self.commit_interval = commit_interval
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.__memory: OrderedDict[str, str] = OrderedDict()
+        self.__pending_writes = 0
+        self.__conn = None
+        if path is not None:
+            self.__conn = sqlite3.connect(str(path))
+            self.__conn.execute("CREATE TABLE IF NOT EXISTS lineage_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.__conn.commit()
+
+    @staticmethod
+    def make_key(kind: str, normalized_sql: str, dialect: str | None = None) -> str:
+        """
+        生成缓存键
+
+        Args:
+            kind: 结果类型，如 tables、columns
+            normalized_sql: 规范化后的语句文本，如 SqlHelper.normalize 的结果或按方言分词得到的词法单元序列
+            dialect: SQL方言
+
+        Returns:
+            十六进制哈希值
+        """
+        content = f"{kind}\0{dialect or ''}\0{normalized_sql}"
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+    def lookup(self, key: str) -> tuple[bool, Any]:
+        """
+        查找缓存
+
+        Returns:
+            (是否命中, 缓存值)，缓存值本身可以为 None
+        """
+        value = self.__memory.get(key)
+        if value is not None:
+            self.__memory.move_to_end(key)
+            self.hits += 1
+            return True, json.loads(value)
+
+        if self.__conn is not None:
+            row = self.__conn.execute("SELECT value FROM lineage_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.__remember(key, row[0])
+                self.hits += 1
+                self.disk_hits += 1
+                return True, json.loads(row[0])
+
+        self.misses += 1
+        return False, None
+
+    def store(self, key: str, result: Any) -> None:
+        """写入缓存"""
+        value = json.dumps(result, ensure_ascii=False)
+        self.__remember(key, value)
+        if self.__conn is not None:
+            self.__conn.execute("INSERT OR REPLACE INTO lineage_cache (key, value) VALUES (?, ?)", (key, value))
+            self.__pending_writes += 1
+            if self.__pending_writes >= self.commit_interval:
+                self.flush()
+
+    def __remember(self, key: str, value: str) -> None:
+        """写入内存 LRU，超出容量时淘汰最久未使用的条目"""
+        self.__memory[key] = value
+        self.__memory.move_to_end(key)
+        while len(self.__memory) > self.maxsize:
+            self.__memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        """命中统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_size": len(self.__memory),
+        }
+
+    def clear(self) -> None:
+        """清空内存和磁盘中的缓存"""
+        self.__memory.clear()
+        if self.__conn is not None:
+            self.__conn.execute("DELETE FROM lineage_cache")
+            self.__conn.commit()
+            self.__pending_writes = 0
+
+    def flush(self) -> None:
+        """提交尚未写入磁盘的缓存"""
+        if self.__conn is not None and self.__pending_writes:
+            self.__conn.commit()
+            self.__pending_writes = 0
+
+    def close(self) -> None:
+        """提交并关闭 SQLite 连接"""
+        if self.__conn is not None:
+            self.flush()
+            self.__conn.close()
+            self.__conn = None
+
+    def __enter__(self) -> "LineageCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -1,11 +1,18 @@
+import json
 from collections import defaultdict
-from contextlib import contextmanager
 from dataclasses import dataclass, field
+from typing import Iterable, Iterator, NamedTuple
 
 import sqlglot
 from sqlglot import expressions as exp
+from sqlglot.dialects.dialect import Dialect
 from sqlglot.errors import ParseError
 from sqlglot.optimizer.qualify import qualify
+from sqlglot.tokens import Token, TokenType
+
+from .cache import LineageCache
+from .helper import SqlHelper, StatementSpan
+from .schema import SchemaCatalog
 
 
 @dataclass
@@ -21,76 +28,313 @@ class UnionContext:
     second_query_col_cnt = 0
 
 
-@dataclass
-class _LineageDict:
-    source_tables: set = field(default_factory=set)
-    source_fields: list = field(default_factory=list)
+class SourceColumn(NamedTuple):
+    """来源字段，可哈希，作为血缘记录中的来源项及去重的键"""
+
+    name: str  # 完整字段名（表名.字段名），非字段来源为表达式的 SQL
+    type: str  # column、function、literal 或 expression
+    table: str = ""  # 来源表，非字段来源为空
+    column: str = ""  # 不带表名的字段名，非字段来源为空
+
+    @classmethod
+    def from_name(cls, name: str, _type: str = "column") -> "SourceColumn":
+        """由完整字段名构造，仅用于从字典形式的血缘数据恢复"""
+        table, _, column = name.rpartition(".")
+        return cls(name, _type, table, column) if table else cls(name, _type)
+
+
+class _ScopeEnter(NamedTuple):
+    """遍历栈中的进入作用域标记"""
+
+    name: str
+
+
+# 遍历栈中的退出作用域标记
+_SCOPE_EXIT = object()
+
+
+class _ColumnMapping(NamedTuple):
+    """作用域字段到来源的单条映射，output 为 `作用域.字段名`"""
+
+    source: SourceColumn
+    output: str
+
+
+@dataclass(slots=True)
+class ColumnLineage:
+    """单个目标字段的血缘记录"""
+
+    column: str
+    sources: tuple[SourceColumn, ...] = ()
+
+    @property
+    def original_columns(self) -> list[str]:
+        """来源字段的完整名称"""
+        return [source.name for source in self.sources]
+
+    @property
+    def source_tables(self) -> set[str]:
+        """来源表"""
+        return {source.table for source in self.sources if source.table}
+
+    def to_dict(self) -> dict:
+        """转换为 extract() 返回的字典形式"""
+        return {"column": self.column, "original_columns": self.original_columns}
+
+    def to_row(self) -> list:
+        """转换为可 JSON 序列化的行，供缓存使用"""
+        return [self.column, [list(source) for source in self.sources]]
+
+    @classmethod
+    def from_row(cls, row: list) -> "ColumnLineage":
+        """由 to_row() 的结果恢复"""
+        column, sources = row
+        return cls(column, tuple(SourceColumn(*source) for source in sources))
 
 
 class ColumnLineageExtractor:
-    def __init__(self, sql, dialect=None):
+    def __init__(
+        self, sql, dialect=None, cache: LineageCache | None = None, schema: SchemaCatalog | None = None
+    ):
         """
         初始化字段血缘提取器
         :param sql: SQL 语句
         :param dialect: SQL 方言（可选）
+        :param cache: 血缘缓存（可选），相同语句（忽略注释和空白差异）不再重复解析
+        :param schema: 表结构目录（可选），用于限定字段及展开 `*`
         """
         self.sql = sql
         self.dialect = dialect
+        self.cache = cache
+        self.schema = schema
         self.scope_stack = []  # 作用域栈
         self.target_table = "unknown"
         self.target_columns = []
-        self.visited = set()
+        self.visited = set()  # 已访问节点的 id
+        self._stack = []  # 遍历栈
 
-        self.column_mapping = []
+        self.column_mapping: list[_ColumnMapping] = []
+        # 按目标字段索引的血缘记录
+        self.lineage: dict[str, ColumnLineage] = {}
         self.column_lineage = []
+        # 语句在脚本中的位置，仅由 iter_script 创建时设置
+        self.span: StatementSpan | None = None
+        # 语句提取失败的原因，仅由 iter_script(skip_errors=True) 设置
+        self.error: str | None = None
+        # 按表结构目录限定失败的原因，此时语句按没有表结构的方式重新限定
+        self.schema_error: Exception | None = None
 
         # union 上下文
         self.union_context = defaultdict(UnionContext)
 
+    @classmethod
+    def iter_script(
+        cls,
+        script: str,
+        dialect=None,
+        cache: LineageCache | None = None,
+        schema: SchemaCatalog | None = None,
+        source_file: str | None = None,
+        skip_errors: bool = False,
+    ) -> Iterator["ColumnLineageExtractor"]:
+        """
+        对整个SQL脚本只分词一次，按顺序逐条解析语句并提取字段血缘
+
+        方言、分词结果和解析器在所有语句间共用，语句在迭代到时才解析，缓存命中的语句不解析。
+        脚本中有语句无法分词（如未闭合的引号）时，改为由 SqlHelper.split_spans 划分语句后逐条分词解析，
+        只有出错的语句失败；SqlHelper 也无法划分的脚本（如未闭合的多行注释）抛出 ValueError
+
+        :param script: SQL 脚本
+        :param dialect: SQL 方言（可选）
+        :param cache: 血缘缓存（可选）
+        :param schema: 表结构目录（可选），所有语句共用
+        :param source_file: 脚本对应的文件路径，记录在每条语句的 span 中
+        :param skip_errors: 为 True 时提取失败的语句设置 error 后照常产出，否则抛出 ValueError
+        :return: 已完成提取的 ColumnLineageExtractor 迭代器，每条语句一个
+        """
+        _dialect = Dialect.get_or_raise(dialect)
+        parser = _dialect.parser()
+
+        for span, chunk in cls._iter_statements(script, _dialect, source_file, dialect):
+            extractor = cls(span.text, dialect, cache, schema)
+            extractor.span = span
+            try:
+                cache_key, result = extractor._load_cached(chunk)
+                if result is None:
+                    ast = parser.parse(chunk, script)[0] if chunk is not None else _dialect.parse(span.text)[0]
+                    extractor._extract_ast(ast, cache_key)
+            except Exception as e:
+                if not skip_errors:
+                    raise ValueError(f"SQL 解析失败: {span.location}: {str(e)}")
+                extractor.error = str(e)
+            yield extractor
+
+    @classmethod
+    def _iter_statements(
+        cls, script: str, _dialect: Dialect, source_file: str | None, dialect=None
+    ) -> Iterator[tuple[StatementSpan, list[Token] | None]]:
+        """
+        划分脚本中的语句
+
+        :param dialect: 方言名称，改由 SqlHelper 划分时用于决定 `#` 是否为注释
+        :return: (语句位置, 语句的词法单元) 迭代器，整个脚本无法分词时词法单元为 None，由调用方逐条解析
+        """
+        try:
+            tokens = _dialect.tokenize(script)
+        except Exception:
+            try:
+                spans = SqlHelper.split_spans(script, source_file, dialect=dialect if isinstance(dialect, str) else None)
+            except Exception as e:
+                raise ValueError(f"SQL 解析失败: {str(e)}")
+            for span in spans:
+                yield span, None
+            return
+
+        for chunk in cls._split_tokens(tokens):
+            yield StatementSpan(script, chunk[0].start, chunk[-1].end + 1, chunk[0].line, source_file), chunk
+
+    @classmethod
+    def extract_script(
+        cls,
+        script: str,
+        dialect=None,
+        cache: LineageCache | None = None,
+        schema: SchemaCatalog | None = None,
+        source_file: str | None = None,
+        skip_errors: bool = False,
+    ) -> list["ColumnLineageExtractor"]:
+        """提取脚本中每条语句的字段血缘，参数同 iter_script"""
+        return list(cls.iter_script(script, dialect, cache, schema, source_file, skip_errors))
+
+    @staticmethod
+    def _split_tokens(tokens: list[Token]) -> Iterator[list[Token]]:
+        """按 `;` 划分词法单元，跳过空语句"""
+        chunk = []
+        for token in tokens:
+            if token.token_type == TokenType.SEMICOLON:
+                if chunk:
+                    yield chunk
+                chunk = []
+            else:
+                chunk.append(token)
+        if chunk:
+            yield chunk
+
     def extract(self):
         """
         主入口：解析 SQL 并提取字段血缘
         """
         try:
-            self.ast = sqlglot.parse_one(self.sql, read=self.dialect)
-            # 执行表别名限定（自动添加缺失的表别名）
-            self.ast = qualify(self.ast)
+            # 计算缓存键时的分词也会因语句不完整（如未闭合的引号）而失败，同样按解析失败处理
+            cache_key, result = self._load_cached()
+            if result is not None:
+                return result
+            return self._extract_ast(sqlglot.parse_one(self.sql, read=self.dialect), cache_key)
+        except Exception as e:
+            raise ValueError(f"SQL 解析失败: {str(e)}")
 
-            # 提取血缘关系
-            self._traverse_ast(self.ast)
+    def _load_cached(self, tokens: list[Token] | None = None) -> tuple[str | None, dict | None]:
+        """
+        从缓存中恢复血缘
 
-            self._resolve_column_lineage()
-            self._finalize_lineage()
+        :param tokens: 语句的词法单元，iter_script 中直接复用整个脚本的分词结果，为空时按方言对语句分词
+        :return: (缓存键, extract() 的结果)，未启用缓存时缓存键为 None，未命中时结果为 None
+        """
+        if self.cache is None:
+            return None, None
+
+        if tokens is None:
+            tokens = Dialect.get_or_raise(self.dialect).tokenize(self.sql)
+        # 血缘结果依赖表结构，不同表结构下的结果分开缓存
+        kind = "column_records" if self.schema is None else f"column_records:{self.schema.fingerprint}"
+        cache_key = self.cache.make_key(kind, self._tokens_to_key_text(tokens), self.dialect)
+        found, cached = self.cache.lookup(cache_key)
+        if not found:
+            return cache_key, None
+
+        # 目标表和目标字段供显示方法使用，一并恢复
+        self.target_table = cached["target_table"]
+        self.target_columns = cached["target_columns"]
+        self._set_lineage(ColumnLineage.from_row(row) for row in cached["lineage"])
+        return cache_key, {
+            "column_lineage": self.column_lineage,
+        }
 
-            return {
-                "column_lineage": self.column_lineage,
-            }
+    @staticmethod
+    def _tokens_to_key_text(tokens: list[Token]) -> str:
+        """
+        由方言分词结果生成缓存键的语句文本
 
-        except Exception as e:
-            raise ValueError(f"SQL 解析失败: {str(e)}")
+        注释和空白不产生词法单元，引号、转义、`#` 等按方言的规则处理，词法单元相同的语句血缘相同；
+        末尾的 `;` 不参与比较
+        """
+        return json.dumps(
+            [(token.token_type.name, token.text) for token in tokens if token.token_type != TokenType.SEMICOLON],
+            ensure_ascii=False,
+        )
+
+    def _extract_ast(self, ast: exp.Expression, cache_key: str | None):
+        """从已解析的语句中提取字段血缘，结果写入缓存"""
+        # 执行表别名限定（自动添加缺失的表别名），有表结构目录时同时展开 `*`
+        if self.schema is None:
+            self.ast = qualify(ast)
+        else:
+            try:
+                self.ast = qualify(ast, schema=self.schema.mapping_schema)
+            except Exception as e:
+                # 表结构与语句不一致（如缺少字段）时，按没有表结构的方式重新限定
+                self.schema_error = e
+                self.ast = qualify(sqlglot.parse_one(self.sql, read=self.dialect))
+
+        # 提取血缘关系
+        self._traverse_ast(self.ast)
+
+        resolved = self._resolve_column_lineage()
+        self._finalize_lineage(resolved)
+
+        if cache_key is not None:
+            self.cache.store(
+                cache_key,
+                {
+                    "target_table": self.target_table,
+                    "target_columns": self.target_columns,
+                    "lineage": [record.to_row() for record in self.lineage.values()],
+                },
+            )
 
-    def _traverse_ast(self, node: exp.Expression):
-        """递归遍历 AST 并提取血缘关系"""
-        # 避免重复访问节点
-        if node in self.visited:
-            return
+        return {
+            "column_lineage": self.column_lineage,
+        }
 
-        # 根据节点类型处理
-        if isinstance(node, (exp.Insert, exp.Create)):
-            self._handle_insert_node(node)
+    def _traverse_ast(self, root: exp.Expression):
+        """
+        以显式栈先序遍历 AST 并提取血缘关系
 
-        elif isinstance(node, exp.With):
-            self._handle_with_node(node)
-        elif isinstance(node, exp.Subquery):
-            self._handle_subquery_node(node)
-        elif isinstance(node, exp.Union):
-            self._handle_union_node(node)
-        elif isinstance(node, exp.Select):
-            self._handle_select_node(node)
+        节点按 id 去重，不计算 Expression 的结构哈希；作用域的进入和退出以标记压栈，
+        嵌套深度不受递归深度限制
+        """
+        stack = self._stack
+        stack.append(root)
+        while stack:
+            node = stack.pop()
+            if node is _SCOPE_EXIT:
+                self._exit_scope()
+                continue
+            if type(node) is _ScopeEnter:
+                self._enter_scope(node.name)
+                continue
+
+            # 避免重复访问节点
+            node_id = id(node)
+            if node_id in self.visited:
+                continue
+            self.visited.add(node_id)
 
-        # 递归处理子节点
-        self._traverse_children(node)
-        self.visited.add(node)
+            # 先压入子节点，处理方法压入的节点位于其上方，先于子节点处理
+            self._push_children(node)
+            handler = self._get_handler(type(node))
+            if handler is not None:
+                handler(self, node)
 
     def _handle_insert_node(self, node: exp.Insert | exp.Create):
         """处理 INSERT 节点"""
@@ -106,7 +350,8 @@ class ColumnLineageExtractor:
         table_map = {}
 
         # 注册主表
-        from_node = node.args.get("from") or exp.From()
+        # 较新版本的 sqlglot 中 FROM 子句的参数名为 from_
+        from_node = node.args.get("from") or node.args.get("from_") or exp.From()
         self._register_table(from_node.this, table_map)
 
         # 注册连接表
@@ -151,12 +396,11 @@ class ColumnLineageExtractor:
 
     def _handle_column_expressions(self, columns, table_map, output):
         """处理列表达式"""
-        _type = "column"
         for column in columns:
             real_table = table_map.get(column.table, column.table)
-            input = f"{real_table}.{column.name}"
+            source = SourceColumn(f"{real_table}.{column.name}", "column", real_table, column.name)
 
-            self.column_mapping.append({"input": input, "output": output, "type": _type})
+            self.column_mapping.append(_ColumnMapping(source, output))
 
     def _handle_non_column_expressions(self, select_expr, table_map, output):
         """处理非字段表达式（如函数、字面量等）"""
@@ -175,34 +419,39 @@ class ColumnLineageExtractor:
             else:
                 _type = "expression"
 
-            self.column_mapping.append({"input": select_sql, "output": output, "type": _type})
+            self.column_mapping.append(_ColumnMapping(SourceColumn(select_sql, _type), output))
 
     def _handle_star_expression(self, table_map):
-        """处理星号表达式"""
-        raise NotImplementedError("暂不支持 * 语法")
-        # _type = "star"
-        # output = f"{self.current_scope}.*"
+        """
+        处理星号表达式
 
-        # for table in table_map.values():
-        #     input = f"{table}.*"
-        #     self.column_mapping.append({"input": input, "output": output, "type": _type})
+        来源表的表结构已知时 `*` 在表别名限定时已经展开，剩下的 `*` 无法确定字段。
+        按表结构目录限定失败时 `*` 没有展开，来源表不一定缺少，报错中给出限定失败的原因（如目录中的字段已过期）；
+        没有传入表结构目录时 `*` 不会展开
+        """
+        tables = ", ".join(sorted(set(table_map.values()))) or "unknown"
+        if self.schema is None:
+            raise NotImplementedError(f"暂不支持 * 语法，未提供表结构目录，无法展开 *，来源表: {tables}")
+        if self.schema_error is not None:
+            raise NotImplementedError(
+                f"暂不支持 * 语法，按表结构目录限定失败: {self.schema_error}，来源表: {tables}"
+            )
+        raise NotImplementedError(f"暂不支持 * 语法，表结构目录中缺少来源表: {tables}")
 
     def _handle_with_node(self, node: exp.With):
         """处理 WITH 子句（CTE）"""
-        for cte in node.expressions:
+        for cte in reversed(node.expressions):
             cte_name = cte.alias
-            with self._scope_context(cte_name):
-                self._traverse_ast(cte)
+            self._push_scoped(cte_name, cte)
 
     def _handle_subquery_node(self, node: exp.Subquery):
         """处理子查询"""
         subquery_alias = node.alias
         # 处理子查询没有别名的情况
         if not subquery_alias:
-            self._traverse_ast(node.this)
+            self._stack.append(node.this)
         else:
-            with self._scope_context(subquery_alias):
-                self._traverse_ast(node.this)
+            self._push_scoped(subquery_alias, node.this)
 
     def _handle_union_node(self, node: exp.Union):
         """
@@ -247,24 +496,46 @@ class ColumnLineageExtractor:
         """获取 select 节点的列数"""
         return -1 if any(col_exp.is_star for col_exp in node.expressions) else len(node.expressions)
 
-    def _traverse_children(self, node: exp.Expression):
-        """遍历节点的子节点"""
-        for child in node.args.values():
+    # 节点类型到处理方法的分派表，子类按 MRO 查找对应的处理方法
+    # 节点类型 -> 处理方法名，按名称取方法，子类覆盖的处理方法同样生效
+    _NODE_HANDLERS = {
+        exp.Insert: "_handle_insert_node",
+        exp.Create: "_handle_insert_node",
+        exp.With: "_handle_with_node",
+        exp.Subquery: "_handle_subquery_node",
+        exp.Union: "_handle_union_node",
+        exp.Select: "_handle_select_node",
+    }
+    # 节点类型 -> 处理方法，每个类单独缓存
+    _handler_cache: dict = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._handler_cache = {}
+
+    @classmethod
+    def _get_handler(cls, node_type: type):
+        """获取节点类型对应的处理方法，没有时返回 None"""
+        try:
+            return cls._handler_cache[node_type]
+        except KeyError:
+            name = next((cls._NODE_HANDLERS[t] for t in node_type.__mro__ if t in cls._NODE_HANDLERS), None)
+            handler = None if name is None else getattr(cls, name)
+            cls._handler_cache[node_type] = handler
+            return handler
+
+    def _push_children(self, node: exp.Expression):
+        """将节点的子节点逆序压栈，出栈顺序与参数顺序一致"""
+        stack = self._stack
+        for child in reversed(node.args.values()):
             if isinstance(child, (list, tuple)):
-                for item in child:
-                    if isinstance(item, exp.Expression):
-                        self._traverse_ast(item)
+                stack.extend(item for item in reversed(child) if isinstance(item, exp.Expression))
             elif isinstance(child, exp.Expression):
-                self._traverse_ast(child)
+                stack.append(child)
 
-    @contextmanager
-    def _scope_context(self, scope_name):
-        """作用域上下文管理器"""
-        self._enter_scope(scope_name)
-        try:
-            yield
-        finally:
-            self._exit_scope()
+    def _push_scoped(self, scope_name, node: exp.Expression):
+        """压入在指定作用域中遍历的节点"""
+        self._stack += (_SCOPE_EXIT, node, _ScopeEnter(scope_name))
 
     def _enter_scope(self, scope_name):
         """进入新的作用域"""
@@ -297,56 +568,91 @@ class ColumnLineageExtractor:
 
             table_map[alias] = table_name
 
-    def _find_real_column(self, items: list[dict], parent_id):
-        """获取main作用域下的字段的源表和源字段"""
-        children_map = defaultdict(list)
+    def _build_children_map(self, items: list[_ColumnMapping]) -> dict:
+        """按输出字段分组字段映射，整个语句只构建一次"""
+        children_map = {}
         for item in items:
-            children_map[item["output"]].append(item)
-
-        def _get_leaf_node(parent_id):
-            leaf_nodes = set()
-            for item in children_map[parent_id]:
-                if not children_map[item["input"]]:
-                    leaf_nodes.add((item["input"], item["type"]))
-                else:
-                    leaf_nodes.update(_get_leaf_node(item["input"]))
-            return leaf_nodes or {parent_id}
-
-        return _get_leaf_node(parent_id)
+            children_map.setdefault(item.output, []).append(item.source)
+        return children_map
 
-    def _resolve_column_lineage(self):
-        """解析字段血缘关系"""
-        # self.column_lineage = []
-        for item in self.column_mapping:
-            output_scope = item["output"].split(".")[0]
-            if output_scope == "main":
-                real_columns = self._find_real_column(self.column_mapping, item["output"])
-                output_column = item["output"].split(".")[-1]
+    def _find_real_column(self, children_map: dict, parent_id, leaf_cache: dict):
+        """
+        获取main作用域下的字段的源表和源字段
 
-                lineage_item = {"column": output_column, "original_columns": list(real_columns)}
+        以显式栈做后序遍历，每个中间字段的叶子节点只计算一次并缓存在 leaf_cache 中，
+        多个字段共用的 CTE 链不会被重复遍历；字段映射中出现环时，环上的回边不产生叶子节点
+        """
+        if parent_id not in leaf_cache:
+            in_progress = set()
+            stack = [(parent_id, False)]
+            while stack:
+                node, expanded = stack.pop()
+                if node in leaf_cache:
+                    continue
+                if not expanded:
+                    # 先压入自身，子节点处理完后再合并
+                    in_progress.add(node)
+                    stack.append((node, True))
+                    for source in children_map.get(node, ()):
+                        child = source.name
+                        if child in children_map and child not in leaf_cache and child not in in_progress:
+                            stack.append((child, False))
+                    continue
 
-                if lineage_item not in self.column_lineage:
-                    self.column_lineage.append(lineage_item)
+                leaf_nodes = set()
+                for source in children_map.get(node, ()):
+                    if source.name not in children_map:
+                        leaf_nodes.add(source)
+                    else:
+                        leaf_nodes.update(leaf_cache.get(source.name, ()))
+                leaf_cache[node] = frozenset(leaf_nodes)
+                in_progress.discard(node)
 
-    def _finalize_lineage(self):
-        """最终处理字段血缘关系"""
-        new_column_lineage = []
+        return leaf_cache[parent_id]
 
-        for i, item in enumerate(self.column_lineage):
-            new_original_columns = self._process_original_columns(item["original_columns"])
-            new_output_column = self._get_output_column(i, item["column"])
+    def _resolve_column_lineage(self) -> list[tuple[str, frozenset[SourceColumn]]]:
+        """解析字段血缘关系，以 (字段名, 来源集合) 为键去重，按出现顺序返回"""
+        children_map = self._build_children_map(self.column_mapping)
+        leaf_cache = {}
+        resolved = {}
+        for item in self.column_mapping:
+            output_scope, _, output_column = item.output.partition(".")
+            if output_scope == "main":
+                real_columns = self._find_real_column(children_map, item.output, leaf_cache)
+                output_column = output_column.rpartition(".")[2]
+                resolved.setdefault((output_column, real_columns), None)
+        return list(resolved)
+
+    def _finalize_lineage(self, resolved: list[tuple[str, frozenset[SourceColumn]]]):
+        """最终处理字段血缘关系，生成按目标字段索引的血缘记录"""
+        records = []
+        for i, (column, real_columns) in enumerate(resolved):
+            new_output_column = self._get_output_column(i, column)
             if new_output_column:
-                new_item = {"column": new_output_column, "original_columns": new_original_columns}
-                new_column_lineage.append(new_item)
+                records.append(ColumnLineage(new_output_column, self._process_original_columns(real_columns)))
+        self._set_lineage(records)
+
+    def _set_lineage(self, records: Iterable[ColumnLineage]):
+        """
+        设置血缘记录，并生成 extract() 返回的字典列表
 
-        self.column_lineage = new_column_lineage
+        同一目标字段出现多次时合并来源
+        """
+        self.lineage = {}
+        for record in records:
+            existing = self.lineage.get(record.column)
+            if existing is None:
+                self.lineage[record.column] = record
+            else:
+                existing.sources += tuple(s for s in record.sources if s not in existing.sources)
+        self.column_lineage = [record.to_dict() for record in self.lineage.values()]
 
-    def _process_original_columns(self, original_columns: list[tuple[str, str]]):
+    def _process_original_columns(self, original_columns: frozenset[SourceColumn]) -> tuple[SourceColumn, ...]:
         """
-        处理原始列信息
+        处理原始列信息，存在字段来源时只保留字段来源
         """
-        column_items = [item[0] for item in original_columns if item[1] == "column"]
-        return column_items if column_items else [item[0] for item in original_columns]
+        column_items = tuple(source for source in original_columns if source.type == "column")
+        return column_items if column_items else tuple(original_columns)
 
     def _get_output_column(self, index, default_column):
         """获取输出列名"""
@@ -356,6 +662,36 @@ class ColumnLineageExtractor:
         except IndexError:
             return None
 
+    def _lineage_records(self, lineage_data) -> Iterable[ColumnLineage]:
+        """
+        获取血缘记录，lineage_data 为本实例 extract() 的结果时直接使用已有记录，
+        否则由字典形式的血缘数据按目标字段分组恢复
+        """
+        column_lineage = lineage_data.get("column_lineage", [])
+        if column_lineage is self.column_lineage:
+            return self.lineage.values()
+
+        records = {}
+        for column_info in column_lineage:
+            if not isinstance(column_info, dict):
+                continue
+
+            target_column = column_info.get("column", "unknown")
+            if not target_column:
+                continue
+
+            sources = []
+            for orig_item in column_info.get("original_columns", []):
+                # 兼容 (字段, 类型) 元组和字符串两种形式
+                if isinstance(orig_item, (tuple, list)) and len(orig_item) >= 2:
+                    sources.append(SourceColumn.from_name(str(orig_item[0]), str(orig_item[1])))
+                else:
+                    sources.append(SourceColumn.from_name(str(orig_item) if orig_item else ""))
+
+            record = records.setdefault(target_column, ColumnLineage(target_column))
+            record.sources += tuple(sources)
+        return records.values()
+
     def _process_lineage_data(self, lineage_data):
         """
         处理血缘数据，提取公共部分供显示方法使用
@@ -372,69 +708,22 @@ class ColumnLineageExtractor:
         elif not isinstance(output_table, str):
             output_table = str(output_table) if output_table else "unknown"
 
-        # 使用字典按目标字段分组
-        # lineage_dict = defaultdict(lambda: {"source_tables": set(), "source_fields": []})
-        lineage_dict = defaultdict(_LineageDict)
-
-        # 安全获取column_lineage
-        column_lineage = lineage_data.get("column_lineage", [])
-
-        for column_info in column_lineage:
-            if not isinstance(column_info, dict):
-                continue
-
-            target_column = column_info.get("column", "unknown")
-            if not target_column:
-                continue
-
-            original_columns = column_info.get("original_columns", [])
-            for orig_item in original_columns:
-                try:
-                    # 处理原始字段，确保正确解包
-                    if isinstance(orig_item, tuple) and len(orig_item) >= 2:
-                        orig_col, _type = orig_item[0], orig_item[1]
-                    elif isinstance(orig_item, str):
-                        orig_col = orig_item
-                    else:
-                        orig_col = str(orig_item) if orig_item else ""
-
-                    # 解析原始字段的表和列名
-                    if orig_col and "." in orig_col:
-                        parts = orig_col.rsplit(".", 1)
-                        if len(parts) == 2:
-                            source_table, _ = parts
-                            lineage_dict[target_column].source_tables.add(source_table)
-                    lineage_dict[target_column].source_fields.append(orig_col if orig_col else "")
-
-                except Exception:
-                    continue
-
         # 处理字段显示格式
         processed_lineage = {}
-        for target_column, sources in lineage_dict.items():
-            try:
-                source_tables_str = ", ".join(sorted(sources.source_tables)) if sources.source_tables else ""
-
-                # 如果只有一个来源表，则只显示字段名，否则显示完整格式
-                if len(sources.source_tables) == 1 and sources.source_tables:
-                    # 只有一个来源表时，仅显示字段名部分
-                    source_fields = []
-                    for field in sources.source_fields:
-                        if field and "." in field:
-                            source_fields.append(field.split(".")[-1])  # 只取字段名部分
-                        elif field:
-                            source_fields.append(field)
-                    source_fields_str = ", ".join(source_fields) if source_fields else ""
-                else:
-                    # 多个来源表时，显示完整格式
-                    source_fields_str = ", ".join(sources.source_fields) if sources.source_fields else ""
-
-                processed_lineage[target_column] = {
-                    "source_tables_str": source_tables_str,
-                    "source_fields_str": source_fields_str,
-                }
-            except Exception:
-                continue
+        for record in self._lineage_records(lineage_data):
+            source_tables = record.source_tables
+            source_tables_str = ", ".join(sorted(source_tables))
+
+            # 如果只有一个来源表，则只显示字段名，否则显示完整格式
+            if len(source_tables) == 1:
+                source_fields_str = ", ".join(source.column or source.name for source in record.sources if source.name)
+            else:
+                source_fields_str = ", ".join(record.original_columns)
+
+            processed_lineage[record.column] = {
+                "source_tables_str": source_tables_str,
+                "source_fields_str": source_fields_str,
+            }
 
         return output_table, processed_lineage
 
@@ -0,0 +1,242 @@
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Iterable, Iterator, TextIO
+from xml.sax.saxutils import escape, quoteattr
+
+# HTML 页面模板，Mermaid 图描述写在两部分之间
+_MERMAIDJS_HTML_HEAD = """<!DOCTYPE html>
+    <html lang="zh-CN">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>{title}</title>
+        <script type="module">
+        import mermaid from 'https://cdn.jsdelivr.net/npm/mermaid@11/dist/mermaid.esm.min.mjs';
+        mermaid.initialize({{ startOnLoad: true }});
+        </script>
+
+    </head>
+    <body>
+        <div class="mermaid">
+        """
+_MERMAIDJS_HTML_TAIL = """
+        </div>
+    </body>
+    </html>"""
+
+
+def schema_of(node: str) -> str:
+    """表名中的库名（最后一个 `.` 之前的部分），没有库名时返回空字符串"""
+    return node.rpartition(".")[0]
+
+
+def _sorted_graph(edges: Iterable[tuple], nodes: Iterable[str]) -> tuple[list, list]:
+    """边和节点（包含边的端点）均按名称排序，保证输出稳定"""
+    edges = sorted(edges)
+    node_set = set(nodes)
+    for _from, _to in edges:
+        node_set.add(_from)
+        node_set.add(_to)
+    return edges, sorted(node_set)
+
+
+def _group_by_schema(nodes: list) -> dict:
+    """按库名分组，nodes 已排序时各组内同样有序"""
+    groups = {}
+    for node in nodes:
+        groups.setdefault(schema_of(node), []).append(node)
+    return groups
+
+
+def write_mermaid(
+    file: TextIO,
+    edges: Iterable[tuple],
+    nodes: Iterable[str] = (),
+    direction: str = "LR",
+    cluster_by_schema: bool = False,
+) -> None:
+    """
+    以 Mermaid 格式逐行写出图
+
+    Args:
+        file: 文本文件对象
+        edges: 边，每个元素为 (from, to) 元组
+        nodes: 需要额外写出的节点（如没有边的孤立节点）
+        direction: 图方向
+        cluster_by_schema: 是否按库名将节点放入 subgraph
+    """
+    file.write(f"graph {direction}\n")
+    if cluster_by_schema:
+        edges, all_nodes = _sorted_graph(edges, nodes)
+        for schema, schema_nodes in _group_by_schema(all_nodes).items():
+            if schema:
+                file.write(f"    subgraph {schema}\n")
+                file.writelines(f"        {node}\n" for node in schema_nodes)
+                file.write("    end\n")
+            else:
+                file.writelines(f"    {node}\n" for node in schema_nodes)
+    else:
+        edges = sorted(edges)
+        nodes = set(nodes)
+        if nodes:
+            # 没有边的节点单独写出，有边的节点由边隐式声明
+            connected = {node for edge in edges for node in edge}
+            file.writelines(f"    {node}\n" for node in sorted(nodes - connected))
+    file.writelines(f"    {_from} --> {_to}\n" for _from, _to in edges)
+
+
+def _dot_id(name: str) -> str:
+    """DOT 中带引号的标识符"""
+    return '"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def write_dot(
+    file: TextIO,
+    edges: Iterable[tuple],
+    nodes: Iterable[str] = (),
+    direction: str = "LR",
+    cluster_by_schema: bool = False,
+    name: str = "lineage",
+) -> None:
+    """
+    以 Graphviz DOT 格式逐行写出图
+
+    Args:
+        file: 文本文件对象
+        edges: 边，每个元素为 (from, to) 元组
+        nodes: 需要额外写出的节点（如没有边的孤立节点）
+        direction: 图方向，对应 rankdir
+        cluster_by_schema: 是否按库名将节点放入 cluster 子图
+        name: 图名称
+    """
+    edges, all_nodes = _sorted_graph(edges, nodes)
+    file.write(f"digraph {_dot_id(name)} {{\n")
+    file.write(f"    rankdir={direction};\n")
+    if cluster_by_schema:
+        for schema, schema_nodes in _group_by_schema(all_nodes).items():
+            if schema:
+                file.write(f"    subgraph {_dot_id('cluster_' + schema)} {{\n")
+                file.write(f"        label={_dot_id(schema)};\n")
+                file.writelines(f"        {_dot_id(node)};\n" for node in schema_nodes)
+                file.write("    }\n")
+            else:
+                file.writelines(f"    {_dot_id(node)};\n" for node in schema_nodes)
+    else:
+        file.writelines(f"    {_dot_id(node)};\n" for node in all_nodes)
+    file.writelines(f"    {_dot_id(_from)} -> {_dot_id(_to)};\n" for _from, _to in edges)
+    file.write("}\n")
+
+
+def write_graphml(
+    file: TextIO,
+    edges: Iterable[tuple],
+    nodes: Iterable[str] = (),
+    cluster_by_schema: bool = False,
+) -> None:
+    """
+    以 GraphML 格式逐行写出图，每个节点带 schema 属性
+
+    Args:
+        file: 文本文件对象
+        edges: 边，每个元素为 (from, to) 元组
+        nodes: 需要额外写出的节点（如没有边的孤立节点）
+        cluster_by_schema: 是否按库名将节点放入嵌套的 graph 中
+    """
+    edges, all_nodes = _sorted_graph(edges, nodes)
+
+    def node_lines(schema_nodes: list, indent: str) -> Iterator[str]:
+        for node in schema_nodes:
+            yield f'{indent}<node id={quoteattr(node)}><data key="schema">{escape(schema_of(node))}</data></node>\n'
+
+    file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    file.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+    file.write('  <key id="schema" for="node" attr.name="schema" attr.type="string"/>\n')
+    file.write('  <graph id="lineage" edgedefault="directed">\n')
+    if cluster_by_schema:
+        for schema, schema_nodes in _group_by_schema(all_nodes).items():
+            if schema:
+                file.write(f"    <node id={quoteattr('schema:' + schema)}>\n")
+                file.write(f"      <graph id={quoteattr('schema:' + schema + ':')} edgedefault=\"directed\">\n")
+                file.writelines(node_lines(schema_nodes, "        "))
+                file.write("      </graph>\n")
+                file.write("    </node>\n")
+            else:
+                file.writelines(node_lines(schema_nodes, "    "))
+    else:
+        file.writelines(node_lines(all_nodes, "    "))
+    file.writelines(
+        f"    <edge source={quoteattr(_from)} target={quoteattr(_to)}/>\n" for _from, _to in edges
+    )
+    file.write("  </graph>\n")
+    file.write("</graphml>\n")
+
+
+def write_mermaidjs_html(
+    file: TextIO,
+    edges: Iterable[tuple],
+    nodes: Iterable[str] = (),
+    title: str = "DAG Visualization",
+    direction: str = "LR",
+    cluster_by_schema: bool = False,
+) -> None:
+    """
+    写出包含 Mermaid.js 可视化的 HTML 页面，图描述直接写入文件而不先拼接成字符串
+
+    Args:
+        file: 文本文件对象
+        edges: 边，每个元素为 (from, to) 元组
+        nodes: 需要额外写出的节点（如没有边的孤立节点）
+        title: HTML页面标题
+        direction: 图方向
+        cluster_by_schema: 是否按库名将节点放入 subgraph
+    """
+    file.write(_MERMAIDJS_HTML_HEAD.format(title=title))
+    write_mermaid(file, edges, nodes, direction, cluster_by_schema)
+    file.write(_MERMAIDJS_HTML_TAIL)
+
+
+EXPORT_FORMATS = {
+    "mermaid": write_mermaid,
+    "dot": write_dot,
+    "graphml": write_graphml,
+    "html": write_mermaidjs_html,
+}
+
+# 各格式导出文件的扩展名
+EXPORT_EXTENSIONS = {
+    "mermaid": "mmd",
+    "dot": "dot",
+    "graphml": "graphml",
+    "html": "html",
+}
+
+
+def export_graph(
+    file: str | Path | TextIO,
+    edges: Iterable[tuple],
+    nodes: Iterable[str] = (),
+    format: str = "mermaid",
+    **options,
+) -> None:
+    """
+    按指定格式导出图
+
+    Args:
+        file: 文件路径或文本文件对象
+        edges: 边，每个元素为 (from, to) 元组
+        nodes: 需要额外写出的节点（如没有边的孤立节点）
+        format: mermaid、dot、graphml 或 html
+        **options: 对应写出函数的其他参数，如 direction、cluster_by_schema
+
+    Raises:
+        ValueError: 不支持的格式
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {format}, 可选: {', '.join(EXPORT_FORMATS)}")
+    writer = EXPORT_FORMATS[format]
+    if isinstance(file, (str, Path)):
+        context = open(file, "w", encoding="utf-8", buffering=1024 * 1024)
+    else:
+        context = nullcontext(file)
+    with context as f:
+        writer(f, edges, nodes, **options)
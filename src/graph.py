@@ -1,3 +1,26 @@
+import heapq
+import io
+import mmap
+import struct
+import sys
+from array import array
+from collections import deque
+from pathlib import Path
+from typing import Callable, Iterable, NamedTuple, TextIO
+
+from .export import EXPORT_EXTENSIONS, export_graph, write_mermaid, write_mermaidjs_html
+
+# 快照文件格式：文件头之后依次为节点名（UTF-8，以 \0 分隔）、正向 offsets、正向 targets、反向 offsets、反向 targets，
+# 各部分按 8 字节对齐，数组按文件头记录的字节序存储
+SNAPSHOT_MAGIC = b"SQLDAG\0\0"
+SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct("<8sIIQQQ")  # magic、版本、字节序（0 小端，1 大端）、节点数、边数、节点名字节数
+
+# 可达性位集的总大小随强连通分量数平方增长（链状图约为 n²/16 字节，6 万个分量约 200MB），
+# 分量数超过该值时不构建位集，改为每次查询时搜索缩点后的DAG
+REACHABILITY_BITSET_LIMIT = 20000
+
+
 class NodeNotFoundException(Exception):
     """节点不存在异常"""
 
@@ -13,24 +36,321 @@ class NodeExistsException(Exception):
 class CycleDetectedException(Exception):
     """检测到循环依赖异常"""
 
-    pass
+    def __init__(self, message: str, cycle: list | None = None) -> None:
+        """
+        Args:
+            message: 异常信息
+            cycle: 环路径，首尾为同一节点，如 [a, b, a]
+        """
+        super().__init__(message)
+        self.cycle = cycle or []
+
+
+class EdgeSource(NamedTuple):
+    """产生边的SQL语句位置，同一行中的多条语句由起始偏移量区分"""
+
+    file: str
+    line: int
+    offset: int = 0  # 语句在文件中的起始偏移量，直接构造时可省略
+
+
+def _iter_bits(bits: int):
+    """按从低到高的顺序遍历整数中为 1 的位"""
+    binary = bin(bits)
+    length = len(binary)
+    position = binary.rfind("1")
+    while position > 1:
+        yield length - 1 - position
+        position = binary.rfind("1", 0, position)
+
+
+def _strongly_connected_components(nodes: Iterable, successors: Callable[[object], Iterable]) -> list:
+    """
+    计算强连通分量（非递归的 Tarjan 算法），深层链路不受递归深度限制，DagGraph 和 FrozenDagGraph 共用
+
+    Args:
+        nodes: 所有节点（或节点ID）
+        successors: 获取节点下游邻居的函数
+
+    Returns:
+        强连通分量列表，每个分量为节点列表，按 Tarjan 算法的输出顺序（下游在前）
+    """
+    index = {}
+    low_link = {}
+    on_stack = set()
+    stack = []
+    components = []
+    counter = 0
+
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low_link[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors(root)))]
+        while work:
+            node, neighbors = work[-1]
+            for neighbor in neighbors:
+                if neighbor not in index:
+                    index[neighbor] = low_link[neighbor] = counter
+                    counter += 1
+                    stack.append(neighbor)
+                    on_stack.add(neighbor)
+                    work.append((neighbor, iter(successors(neighbor))))
+                    break
+                if neighbor in on_stack:
+                    low_link[node] = min(low_link[node], index[neighbor])
+            else:
+                # 当前节点的邻居已全部访问
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low_link[parent] = min(low_link[parent], low_link[node])
+                if low_link[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+    return components
+
+
+class ReachabilityIndex:
+    """
+    可达性索引
+
+    将强连通分量缩为一个点得到DAG，每个分量的所有下游（或上游）分量以整数位集保存，
+    查询 A 是否为 B 的上游只需一次位运算。分量按 Tarjan 算法的输出顺序编号，
+    该顺序中下游分量总是先于上游分量输出，因此下游位集可按编号顺序一次计算完成。
+    上游位集在第一次查询上游时才计算。索引只对构建时的图有效，由 DagGraph 在边变化时丢弃。
+
+    位集的总大小与分量数的平方成正比，分量数超过 bitset_limit 时不构建位集，
+    每次查询搜索缩点后的DAG，内存与节点数和边数成正比。is_upstream 先用区间标签排除不可达的分量：
+    对缩点后的DAG做两次深度优先遍历（后继分别按正序、逆序访问），每个分量记录后序编号及其所有下游中最小的后序编号，
+    A 能到达 B 时 B 的区间一定包含在 A 的区间内，区间不包含时直接返回 False，搜索时也跳过这样的分量
+    """
+
+    def __init__(self, components: list, adjacency_list: dict, bitset_limit: int = REACHABILITY_BITSET_LIMIT) -> None:
+        """
+        Args:
+            components: 强连通分量列表，需按 Tarjan 算法的输出顺序（下游在前）
+            adjacency_list: 节点 -> 下游节点集合
+            bitset_limit: 构建位集的最大分量数，超过时改为逐次搜索
+        """
+        self.__members = components
+        self.__component_of = {node: index for index, component in enumerate(components) for node in component}
+        component_of = self.__component_of
+
+        # 缩点后每个分量的下游分量，分量在环上（多个节点或自环）时自身也是自己的下游
+        self.__successors = []
+        self.__cyclic = []
+        for index, component in enumerate(components):
+            successors = {component_of[neighbor] for node in component for neighbor in adjacency_list[node]}
+            self.__cyclic.append(index in successors)
+            successors.discard(index)
+            self.__successors.append(successors)
+
+        self.__use_bitsets = len(components) <= bitset_limit
+        self.__descendant_bits = self.__build_descendant_bits() if self.__use_bitsets else None
+        self.__ancestor_bits = None
+        self.__predecessors = None
+        self.__intervals = None if self.__use_bitsets else self.__build_intervals()
+
+    @property
+    def uses_bitsets(self) -> bool:
+        """是否使用位集，False 表示查询时搜索缩点后的DAG"""
+        return self.__use_bitsets
+
+    def __build_descendant_bits(self) -> list:
+        """按下游在前的顺序计算每个分量的下游位集"""
+        descendant_bits = []
+        for index, successors in enumerate(self.__successors):
+            bits = 1 << index if self.__cyclic[index] else 0
+            for successor in successors:
+                bits |= descendant_bits[successor] | (1 << successor)
+            descendant_bits.append(bits)
+        return descendant_bits
+
+    def __get_predecessors(self) -> list:
+        """缩点后每个分量的上游分量"""
+        if self.__predecessors is None:
+            predecessors = [[] for _ in range(len(self.__members))]
+            for index, successors in enumerate(self.__successors):
+                for successor in successors:
+                    predecessors[successor].append(index)
+            self.__predecessors = predecessors
+        return self.__predecessors
+
+    def __build_ancestor_bits(self) -> list:
+        """按上游在前的顺序计算每个分量的上游位集"""
+        count = len(self.__members)
+        predecessors = self.__get_predecessors()
+
+        ancestor_bits = [0] * count
+        for index in range(count - 1, -1, -1):
+            bits = 1 << index if self.__cyclic[index] else 0
+            for predecessor in predecessors[index]:
+                bits |= ancestor_bits[predecessor] | (1 << predecessor)
+            ancestor_bits[index] = bits
+        return ancestor_bits
+
+    def __build_intervals(self) -> list:
+        """
+        计算区间标签
+
+        Returns:
+            [(后序编号列表, 最小下游后序编号列表), ...]，每次遍历一组
+        """
+        successors = [list(successors) for successors in self.__successors]
+        has_predecessor = [False] * len(successors)
+        for neighbors in successors:
+            for neighbor in neighbors:
+                has_predecessor[neighbor] = True
+        roots = [index for index, flag in enumerate(has_predecessor) if not flag]
+
+        intervals = []
+        for order in (lambda items: items, reversed):
+            post = [-1] * len(successors)
+            rank = 0
+            for root in order(roots):
+                stack = [(root, iter(order(successors[root])))]
+                post[root] = -2  # 已访问但未完成
+                while stack:
+                    index, neighbors = stack[-1]
+                    for neighbor in neighbors:
+                        if post[neighbor] == -1:
+                            post[neighbor] = -2
+                            stack.append((neighbor, iter(order(successors[neighbor]))))
+                            break
+                    else:
+                        stack.pop()
+                        post[index] = rank
+                        rank += 1
+            # 下游分量的编号更小，按编号升序计算时下游的最小值已经算好
+            low = post[:]
+            for index, neighbors in enumerate(successors):
+                for neighbor in neighbors:
+                    if low[neighbor] < low[index]:
+                        low[index] = low[neighbor]
+            intervals.append((post, low))
+        return intervals
+
+    def __may_reach(self, source: int, target: int) -> bool:
+        """区间标签不排除 source 到达 target 时返回 True"""
+        for post, low in self.__intervals:
+            if post[target] > post[source] or low[target] < low[source]:
+                return False
+        return True
+
+    def __search(self, start: int, neighbors: list) -> set:
+        """从分量 start 出发沿 neighbors 搜索可达的分量（不含 start）"""
+        visited = set()
+        stack = [start]
+        while stack:
+            for neighbor in neighbors[stack.pop()]:
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    stack.append(neighbor)
+        return visited
+
+    def __component(self, node: str) -> int:
+        try:
+            return self.__component_of[node]
+        except KeyError:
+            raise NodeNotFoundException(f"节点不存在:{node}") from None
+
+    def __nodes_of(self, bits: int) -> set:
+        members = self.__members
+        return {node for index in _iter_bits(bits) for node in members[index]}
+
+    def __nodes_of_components(self, start: int, components: set) -> set:
+        """分量集合中的所有节点，start 在环上时包含 start 自身"""
+        if self.__cyclic[start]:
+            components.add(start)
+        members = self.__members
+        return {node for index in components for node in members[index]}
+
+    def is_upstream(self, upstream: str, downstream: str) -> bool:
+        """upstream 是否直接或间接写入 downstream"""
+        source, target = self.__component(upstream), self.__component(downstream)
+        if self.__use_bitsets:
+            return bool(self.__descendant_bits[source] >> target & 1)
+        if source == target:
+            return self.__cyclic[source]
+        # 下游分量的编号总是小于上游分量，编号小于 target 的分量不可能到达 target
+        if target > source or not self.__may_reach(source, target):
+            return False
+        successors = self.__successors
+        visited = {source}
+        stack = [source]
+        while stack:
+            for successor in successors[stack.pop()]:
+                if successor == target:
+                    return True
+                if successor > target and successor not in visited and self.__may_reach(successor, target):
+                    visited.add(successor)
+                    stack.append(successor)
+        return False
+
+    def upstream_set(self, node: str) -> set:
+        """直接或间接写入 node 的所有表"""
+        component = self.__component(node)
+        if not self.__use_bitsets:
+            return self.__nodes_of_components(component, self.__search(component, self.__get_predecessors()))
+        if self.__ancestor_bits is None:
+            self.__ancestor_bits = self.__build_ancestor_bits()
+        return self.__nodes_of(self.__ancestor_bits[component])
+
+    def downstream_set(self, node: str) -> set:
+        """node 直接或间接写入的所有表"""
+        component = self.__component(node)
+        if not self.__use_bitsets:
+            return self.__nodes_of_components(component, self.__search(component, self.__successors))
+        return self.__nodes_of(self.__descendant_bits[component])
 
 
 class DagGraph:
-    def __init__(self, nodes: list | None = None) -> None:
+    # 添加边时的环检测模式
+    CYCLE_CHECK_MODES = ("off", "reject", "report")
+
+    def __init__(self, nodes: list | None = None, cycle_check: str = "off") -> None:
         """
         初始化DAG图
 
         Args:
             nodes: 初始节点列表，默认为空列表
+            cycle_check: 添加边时的环检测模式。off 不检测；reject 拒绝会形成环的边并抛出
+                CycleDetectedException；report 照常添加，记录该边形成的环，可通过 get_reported_cycles 获取。
+                检测通过增量维护拓扑序（Pearce-Kelly 算法）实现，只搜索拓扑序受影响的区间
         """
+        if cycle_check not in self.CYCLE_CHECK_MODES:
+            raise ValueError(f"不支持的环检测模式: {cycle_check}, 可选: {', '.join(self.CYCLE_CHECK_MODES)}")
         if nodes is None:
             nodes = []
+        self.cycle_check = cycle_check
         self.__nodes = set(nodes)  # 使用集合提升查找效率
         self.__edges = set()  # 使用集合存储边
         self.__adjacency_list = {}  # 邻接表，用于快速遍历
+        self.__reverse_adjacency_list = {}  # 反向邻接表，用于上游遍历
+        self.__edge_sources = {}  # 边 -> 产生该边的语句集合，集合大小即引用计数，None 表示直接添加；没有记录的边只被直接添加过
+        self.__source_edges = {}  # 语句 -> 该语句产生的边集合
+        self.__file_sources = {}  # 文件 -> 该文件中产生过边的语句集合
+        self.__topo_index = {}  # 开启环检测时维护的拓扑序，节点 -> 序号
+        self.__next_topo_index = 0
+        self.__cycle_edges = {}  # report 模式下形成环的边 -> 环路径，这些边不参与拓扑序维护
+        self.__reachability = None  # 可达性索引，首次查询时构建，图变化时丢弃
+        self.__weak_components = None  # 弱连通分量列表，首次查询时构建，图变化时丢弃
+        self.__weak_component_of = None  # 节点 -> 弱连通分量序号
         for node in nodes:
             self.__adjacency_list[node] = set()
+            self.__reverse_adjacency_list[node] = set()
+            self.__assign_topo_index(node)
 
     def add_node(self, node: str) -> None:
         """
@@ -45,8 +365,18 @@ class DagGraph:
         if node in self.__nodes:
             raise NodeExistsException(f"节点已存在:{node}")
         self.__nodes.add(node)
+        self.__invalidate_indexes()
         if node not in self.__adjacency_list:
             self.__adjacency_list[node] = set()
+        if node not in self.__reverse_adjacency_list:
+            self.__reverse_adjacency_list[node] = set()
+        self.__assign_topo_index(node)
+
+    def __assign_topo_index(self, node: str) -> None:
+        """开启环检测时，新节点排在拓扑序末尾"""
+        if self.cycle_check != "off":
+            self.__topo_index[node] = self.__next_topo_index
+            self.__next_topo_index += 1
 
     def remove_node(self, node: str) -> None:
         """
@@ -64,41 +394,68 @@ class DagGraph:
         # 删除节点
         self.__nodes.discard(node)
 
-        # 删除与该节点相关的所有边
-        edges_to_remove = {(f, t) for f, t in self.__edges if f == node or t == node}
-        self.__edges -= edges_to_remove
-
-        # 更新邻接表
-        if node in self.__adjacency_list:
-            del self.__adjacency_list[node]
-        for adjacent in self.__adjacency_list:
-            self.__adjacency_list[adjacent].discard(node)
-
-    def add_edge(self, _from: str, _to: str) -> None:
+        # 通过正反邻接表删除与该节点相关的所有边
+        for downstream in list(self.__adjacency_list[node]):
+            self.__drop_edge((node, downstream))
+        for upstream in list(self.__reverse_adjacency_list[node]):
+            self.__drop_edge((upstream, node))
+        del self.__adjacency_list[node]
+        del self.__reverse_adjacency_list[node]
+        self.__topo_index.pop(node, None)
+        self.__invalidate_indexes()
+
+    def add_edge(self, _from: str, _to: str, source: EdgeSource | None = None) -> None:
         """
         添加边，如果节点不存在则自动添加
 
         Args:
             _from: 起始节点
             _to: 目标节点
+            source: 产生该边的语句，多条语句产生同一条边时分别记录，全部撤回后才删除该边
 
         Raises:
-            CycleDetectedException: 如果添加该边会形成环
+            CycleDetectedException: cycle_check 为 reject 且添加该边会形成环
         """
+        edge = (_from, _to)
+        is_new_edge = edge not in self.__edges
+        check_cycle = self.cycle_check != "off" and is_new_edge
+
+        # 先检查是否会形成环，拒绝添加时不留下新节点；含新节点的边只可能形成自环
+        if check_cycle and (_from == _to or (_from in self.__nodes and _to in self.__nodes)):
+            check_cycle = False
+            cycle = self.__update_topo_order(_from, _to)
+            if cycle:
+                if self.cycle_check == "reject":
+                    raise CycleDetectedException(f"添加边 {_from} -> {_to} 会形成环: {' -> '.join(cycle)}", cycle)
+                self.__cycle_edges[edge] = cycle
+
         # 自动添加不存在的节点
         if _from not in self.__nodes:
             self.add_node(_from)
         if _to not in self.__nodes:
             self.add_node(_to)
-
-        # 检查是否会形成环
-        # if self.__would_create_cycle(_from, _to):
-        #     raise CycleDetectedException(f"添加边 {_from} -> {_to} 会形成环")
+        # 新节点排在拓扑序末尾，新的起始节点需要调整到 _to 之前，不会形成环
+        if check_cycle:
+            self.__update_topo_order(_from, _to)
 
         # 添加边
-        edge = (_from, _to)
-        self.__edges.add(edge)
-        self.__adjacency_list[_from].add(_to)
+        if is_new_edge:
+            self.__invalidate_indexes()
+            self.__edges.add(edge)
+            self.__adjacency_list[_from].add(_to)
+            self.__reverse_adjacency_list[_to].add(_from)
+
+        # 记录边的来源，只直接添加过的边不建立来源集合
+        sources = self.__edge_sources.get(edge)
+        if source is None:
+            if sources is not None:
+                sources.add(None)
+        else:
+            if sources is None:
+                sources = self.__edge_sources[edge] = set() if is_new_edge else {None}
+            sources.add(source)
+            self.__source_edges.setdefault(source, set()).add(edge)
+            self.__file_sources.setdefault(source.file, set()).add(source)
 
     def remove_edge(self, _from: str, _to: str) -> None:
         """
@@ -116,10 +473,188 @@ class DagGraph:
         if _to not in self.__nodes:
             raise NodeNotFoundException(f"节点不存在:{_to}")
 
-        edge = (_from, _to)
+        self.__drop_edge((_from, _to))
+
+    def __drop_edge(self, edge: tuple) -> None:
+        """删除边及其来源记录，不论引用计数"""
+        _from, _to = edge
+        if edge in self.__edges:
+            self.__invalidate_indexes()
         self.__edges.discard(edge)
-        if _from in self.__adjacency_list:
-            self.__adjacency_list[_from].discard(_to)
+        self.__adjacency_list[_from].discard(_to)
+        self.__reverse_adjacency_list[_to].discard(_from)
+        self.__cycle_edges.pop(edge, None)
+        for source in self.__edge_sources.pop(edge, ()):
+            if source is not None:
+                self.__forget_source_edge(source, edge)
+
+    def __forget_source_edge(self, source: EdgeSource, edge: tuple) -> None:
+        """从语句的边集合中移除一条边，语句不再有边时一并移除语句"""
+        edges = self.__source_edges[source]
+        edges.discard(edge)
+        if not edges:
+            del self.__source_edges[source]
+            file_sources = self.__file_sources[source.file]
+            file_sources.discard(source)
+            if not file_sources:
+                del self.__file_sources[source.file]
+
+    def get_edge_sources(self, _from: str, _to: str) -> list:
+        """
+        获取产生边的所有语句
+
+        Args:
+            _from: 起始节点
+            _to: 目标节点
+
+        Returns:
+            EdgeSource 列表（按文件、行号、偏移量排序），直接添加的边不计入
+        """
+        sources = self.__edge_sources.get((_from, _to), ())
+        return sorted(source for source in sources if source is not None)
+
+    def get_source_files(self) -> list:
+        """
+        获取产生过边的所有文件
+
+        Returns:
+            文件列表
+        """
+        return sorted(self.__file_sources)
+
+    def retract_source(self, source: EdgeSource, prune_nodes: bool = True) -> list:
+        """
+        撤回一条语句产生的边，只删除引用计数归零的边，耗时与该语句的边数成正比
+
+        Args:
+            source: 语句位置
+            prune_nodes: 是否删除因此不再有任何边的节点
+
+        Returns:
+            被删除的边列表
+        """
+        removed_edges = []
+        for edge in list(self.__source_edges.get(source, ())):
+            self.__forget_source_edge(source, edge)
+            sources = self.__edge_sources[edge]
+            sources.discard(source)
+            if not sources:
+                self.__drop_edge(edge)
+                removed_edges.append(edge)
+
+        if prune_nodes:
+            for _from, _to in removed_edges:
+                for node in (_from, _to):
+                    if node in self.__nodes and self.__is_isolated(node):
+                        self.remove_node(node)
+        return sorted(removed_edges)
+
+    def __is_isolated(self, node: str) -> bool:
+        """节点是否没有任何边"""
+        return not self.__adjacency_list[node] and not self.__reverse_adjacency_list[node]
+
+    def retract_file(self, file: str, prune_nodes: bool = True) -> list:
+        """
+        撤回一个文件中所有语句产生的边，文件修改后先撤回再重新添加即可增量更新DAG
+
+        Args:
+            file: 文件路径
+            prune_nodes: 是否删除因此不再有任何边的节点
+
+        Returns:
+            被删除的边列表
+        """
+        removed_edges = []
+        for source in list(self.__file_sources.get(file, ())):
+            removed_edges.extend(self.retract_source(source, prune_nodes))
+        return sorted(removed_edges)
+
+    def __invalidate_indexes(self) -> None:
+        """图的节点或边变化后丢弃可达性索引和连通分量"""
+        self.__reachability = None
+        self.__weak_components = None
+        self.__weak_component_of = None
+
+    def build_reachability_index(self) -> ReachabilityIndex:
+        """
+        构建（或返回已构建的）可达性索引，图的节点或边变化后索引失效，下次查询时重新构建
+
+        索引为每个强连通分量保存下游（及上游）位集，内存与分量数的平方成正比：链状图约为 n²/16 字节，
+        6 万个分量约 200MB，18 万个约 1.5GB。分量数超过 REACHABILITY_BITSET_LIMIT 时不构建位集，
+        查询时搜索缩点后的DAG，内存与节点数和边数成正比，单次查询最坏需遍历整个图
+
+        Returns:
+            ReachabilityIndex 对象
+        """
+        if self.__reachability is None:
+            self.__reachability = ReachabilityIndex(self.__strongly_connected_components(), self.__adjacency_list)
+        return self.__reachability
+
+    def is_upstream(self, upstream: str, downstream: str) -> bool:
+        """
+        判断 upstream 是否直接或间接写入 downstream，基于可达性索引，多次查询时无需遍历图
+
+        首次查询时构建索引，内存开销见 build_reachability_index；强连通分量数超过 REACHABILITY_BITSET_LIMIT 时
+        不构建位集，每次查询搜索缩点后的DAG
+
+        Args:
+            upstream: 上游节点
+            downstream: 下游节点
+
+        Returns:
+            True 如果 downstream 依赖 upstream
+
+        Raises:
+            NodeNotFoundException: 节点不存在
+        """
+        return self.build_reachability_index().is_upstream(upstream, downstream)
+
+    def upstream_set(self, node: str) -> set:
+        """
+        获取直接或间接写入该节点的所有节点，基于可达性索引
+
+        Raises:
+            NodeNotFoundException: 节点不存在
+        """
+        return self.build_reachability_index().upstream_set(node)
+
+    def downstream_set(self, node: str) -> set:
+        """
+        获取该节点直接或间接写入的所有节点，基于可达性索引
+
+        Raises:
+            NodeNotFoundException: 节点不存在
+        """
+        return self.build_reachability_index().downstream_set(node)
+
+    def save(self, path: str | Path) -> None:
+        """
+        保存为二进制快照，格式见 FrozenDagGraph.save，边的来源记录不会保存
+
+        Args:
+            path: 文件路径
+        """
+        self.freeze().save(path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "DagGraph":
+        """
+        从二进制快照加载为可修改的 DagGraph，只做查询时使用 FrozenDagGraph.load 更快
+
+        Args:
+            path: 文件路径
+        """
+        return FrozenDagGraph.load(path).thaw()
+
+    def freeze(self) -> "FrozenDagGraph":
+        """
+        构建只读的紧凑DAG图，节点名映射为整数ID，邻接关系以CSR数组存储，适合大图的查询。
+        查询方法与本图相同，不支持修改图、边的来源记录（get_edge_sources 等）和 get_reported_cycles
+
+        Returns:
+            FrozenDagGraph 对象，之后对本图的修改不会影响它
+        """
+        return FrozenDagGraph._from_adjacency(self.__nodes, self.__adjacency_list, self.__reverse_adjacency_list)
 
     def get_nodes(self) -> list:
         """
@@ -139,66 +674,321 @@ class DagGraph:
         """
         return sorted(list(self.__edges))
 
-    def __would_create_cycle(self, from_node: str, to_node: str) -> bool:
+    def __update_topo_order(self, _from: str, _to: str) -> list | None:
+        """
+        添加边前增量维护拓扑序（Pearce-Kelly 算法）
+
+        只有 _to 排在 _from 之前时才需要调整：从 _to 向下游搜索序号小于 _from 的节点，
+        若能到达 _from 则形成环；否则从 _from 向上游搜索序号大于 _to 的节点，
+        将两部分节点在原有序号中重新分配，上游部分排在前面。
+
+        Returns:
+            会形成的环路径（_from -> _to -> ... -> _from），不形成环时返回 None
+        """
+        if _from == _to:
+            return [_from, _to]
+
+        order = self.__topo_index
+        lower, upper = order[_to], order[_from]
+        if lower > upper:
+            return None
+
+        cycle_edges = self.__cycle_edges
+        # 向下游搜索，记录父节点以便还原环路径
+        parents = {_to: None}
+        stack = [_to]
+        forward = []
+        while stack:
+            node = stack.pop()
+            forward.append(node)
+            for downstream in self.__adjacency_list[node]:
+                if cycle_edges and (node, downstream) in cycle_edges:
+                    continue
+                if downstream == _from:
+                    path = [node]
+                    while parents[path[-1]] is not None:
+                        path.append(parents[path[-1]])
+                    path.reverse()
+                    return [_from, *path, _from]
+                if downstream not in parents and order[downstream] < upper:
+                    parents[downstream] = node
+                    stack.append(downstream)
+
+        # 向上游搜索
+        visited = {_from}
+        stack = [_from]
+        backward = []
+        while stack:
+            node = stack.pop()
+            backward.append(node)
+            for upstream in self.__reverse_adjacency_list[node]:
+                if cycle_edges and (upstream, node) in cycle_edges:
+                    continue
+                if upstream not in visited and order[upstream] > lower:
+                    visited.add(upstream)
+                    stack.append(upstream)
+
+        # 上游部分整体排在下游部分之前，各部分内部保持原有相对顺序
+        backward.sort(key=order.__getitem__)
+        forward.sort(key=order.__getitem__)
+        indexes = sorted(order[node] for node in backward + forward)
+        for node, index in zip(backward + forward, indexes):
+            order[node] = index
+        return None
+
+    def get_reported_cycles(self) -> list:
+        """
+        获取 report 模式下添加边时发现的环
+
+        Returns:
+            环路径列表，每条路径首尾为同一节点
+        """
+        return [self.__cycle_edges[edge] for edge in sorted(self.__cycle_edges)]
+
+    def __strongly_connected_components(self) -> list:
         """
-        检查添加边是否会形成环
+        计算强连通分量
+
+        Returns:
+            强连通分量列表，每个分量为节点列表，按 Tarjan 算法的输出顺序（下游在前）
+        """
+        return _strongly_connected_components(self.__nodes, self.__adjacency_list.__getitem__)
+
+    def __find_cycle_in(self, members: set, start: str) -> list:
+        """在强连通分量内广度优先查找经过 start 的最短环"""
+        parents = {start: None}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for neighbor in sorted(self.__adjacency_list[node]):
+                if neighbor == start:
+                    path = [node]
+                    while parents[path[-1]] is not None:
+                        path.append(parents[path[-1]])
+                    path.reverse()
+                    return [*path, start]
+                if neighbor in members and neighbor not in parents:
+                    parents[neighbor] = node
+                    queue.append(neighbor)
+        return []
+
+    def strongly_connected_components(self) -> list:
+        """
+        计算强连通分量，线性时间，不递归。同一分量中的表互相依赖（存在环）
+
+        Returns:
+            分量列表，每个分量为按名称排序的节点列表，按节点数从大到小、首个节点名称排序
+        """
+        components = [sorted(component) for component in self.__strongly_connected_components()]
+        return sorted(components, key=lambda component: (-len(component), component[0]))
+
+    def __build_weak_components(self) -> None:
+        """忽略边的方向，按正反邻接表广度优先划分弱连通分量"""
+        component_of = {}
+        components = []
+        for root in sorted(self.__nodes):
+            if root in component_of:
+                continue
+            index = len(components)
+            component_of[root] = index
+            # 列表在遍历过程中追加，即广度优先的队列
+            members = [root]
+            for node in members:
+                for neighbor in self.__adjacency_list[node] | self.__reverse_adjacency_list[node]:
+                    if neighbor not in component_of:
+                        component_of[neighbor] = index
+                        members.append(neighbor)
+            components.append(sorted(members))
+        self.__weak_components = components
+        self.__weak_component_of = component_of
+
+    def weakly_connected_components(self) -> list:
+        """
+        计算弱连通分量（忽略边的方向），线性时间，结果缓存到图变化为止。
+        不同分量之间没有任何血缘关系，可以分别查询和展示
+
+        Returns:
+            分量列表，每个分量为按名称排序的节点列表，按节点数从大到小、首个节点名称排序
+        """
+        if self.__weak_components is None:
+            self.__build_weak_components()
+        return sorted(self.__weak_components, key=lambda component: (-len(component), component[0]))
+
+    def component_of(self, node: str) -> list:
+        """
+        获取节点所在的弱连通分量，即与该表存在任意方向血缘关系的所有表
 
         Args:
-            from_node: 起始节点
-            to_node: 目标节点
+            node: 节点名称
 
         Returns:
-            True 如果会形成环
+            按名称排序的节点列表
+
+        Raises:
+            NodeNotFoundException: 节点不存在
         """
-        if from_node == to_node:
-            return True
+        if node not in self.__nodes:
+            raise NodeNotFoundException(f"节点不存在:{node}")
+        if self.__weak_components is None:
+            self.__build_weak_components()
+        return list(self.__weak_components[self.__weak_component_of[node]])
 
-        # 从 to_node 开始DFS，看能否到达 from_node
-        visited = set()
-        stack = [to_node]
+    def get_component_edges(self, nodes: Iterable[str]) -> set:
+        """
+        获取分量内部的所有边，只访问分量中节点的邻接表
 
-        while stack:
-            current = stack.pop()
-            if current == from_node:
-                return True
-            if current not in visited:
-                visited.add(current)
-                # 获取当前节点的所有下游节点
-                if current in self.__adjacency_list:
-                    stack.extend(self.__adjacency_list[current])
+        Args:
+            nodes: 分量的节点，如 component_of 的结果
 
-        return False
+        Returns:
+            边集合
+        """
+        nodes = set(nodes)
+        return {
+            (node, downstream)
+            for node in nodes
+            if node in self.__adjacency_list
+            for downstream in self.__adjacency_list[node]
+            if downstream in nodes
+        }
+
+    def export_components(self, directory: str | Path, format: str = "html", min_size: int = 1, **options) -> list:
+        """
+        每个弱连通分量单独导出一个文件，文件名为 component_序号.扩展名，序号按分量从大到小编号
 
-    def has_cycle(self) -> bool:
+        Args:
+            directory: 输出目录，不存在时自动创建
+            format: mermaid、dot、graphml 或 html
+            min_size: 节点数少于该值的分量不导出
+            **options: 传给对应写出函数的参数，如 cluster_by_schema
+
+        Returns:
+            写出的文件路径列表
         """
-        检测图中是否存在环
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for index, component in enumerate(self.weakly_connected_components()):
+            if len(component) < min_size:
+                continue
+            path = directory / f"component_{index:04d}.{EXPORT_EXTENSIONS.get(format, format)}"
+            export_graph(path, self.get_component_edges(component), component, format, **options)
+            paths.append(path)
+        return paths
+
+    def has_cycle(self) -> list:
+        """
+        检测图中是否存在环（非递归），每个强连通分量给出一条经过其最小节点的环
 
         Returns:
-            True 如果存在环
+            环路径列表，每条路径首尾为同一节点，如 [a, b, a]；无环时返回空列表，可直接用于真值判断
         """
-        visited = set()
-        rec_stack = set()
+        cycles = []
+        for component in self.__strongly_connected_components():
+            start = min(component)
+            if len(component) > 1 or start in self.__adjacency_list[start]:
+                cycles.append(self.__find_cycle_in(set(component), start))
+        return sorted(cycles)
+
+    def __in_degrees(self) -> dict:
+        """每个节点的入度"""
+        return {node: len(self.__reverse_adjacency_list[node]) for node in self.__nodes}
+
+    def __raise_cycle(self, in_degree: dict) -> None:
+        """拓扑排序未能移除所有节点时，剩余节点中必然存在环"""
+        remaining = sorted(node for node, degree in in_degree.items() if degree > 0)
+        raise CycleDetectedException(f"图中存在环，无法排序的节点（环及其下游）: {', '.join(remaining)}")
+
+    def topological_order(self) -> list:
+        """
+        拓扑排序（Kahn 算法），上游表排在下游表之前，同时可执行的表按名称排序，结果稳定
 
-        def dfs(node: str) -> bool:
-            visited.add(node)
-            rec_stack.add(node)
+        Returns:
+            节点列表
 
-            for neighbor in self.__adjacency_list.get(node, set()):
-                if neighbor not in visited:
-                    if dfs(neighbor):
-                        return True
-                elif neighbor in rec_stack:
-                    return True
+        Raises:
+            CycleDetectedException: 图中存在环
+        """
+        in_degree = self.__in_degrees()
+        ready = [node for node, degree in in_degree.items() if degree == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            node = heapq.heappop(ready)
+            order.append(node)
+            for downstream in self.__adjacency_list[node]:
+                in_degree[downstream] -= 1
+                if in_degree[downstream] == 0:
+                    heapq.heappush(ready, downstream)
+
+        if len(order) != len(self.__nodes):
+            self.__raise_cycle(in_degree)
+        return order
+
+    def execution_levels(self) -> list:
+        """
+        按层划分可并行执行的表：第 0 层没有上游，其余每层的表只依赖之前各层的表
 
-            rec_stack.remove(node)
-            return False
+        Returns:
+            层列表，每层为按名称排序的节点列表
 
-        for node in self.__nodes:
-            if node not in visited:
-                if dfs(node):
-                    return True
+        Raises:
+            CycleDetectedException: 图中存在环
+        """
+        in_degree = self.__in_degrees()
+        level = sorted(node for node, degree in in_degree.items() if degree == 0)
+        levels = []
+        visited_count = 0
+        while level:
+            levels.append(level)
+            visited_count += len(level)
+            next_level = []
+            for node in level:
+                for downstream in self.__adjacency_list[node]:
+                    in_degree[downstream] -= 1
+                    if in_degree[downstream] == 0:
+                        next_level.append(downstream)
+            level = sorted(next_level)
+
+        if visited_count != len(self.__nodes):
+            self.__raise_cycle(in_degree)
+        return levels
+
+    def critical_path(self, weights: dict | None = None, default_weight: float = 1.0) -> tuple[list, float]:
+        """
+        计算关键路径，即总耗时最长的依赖链，决定整批任务的最短完成时间
 
-        return False
+        Args:
+            weights: 每张表的耗时，如 {"dw.t1": 120.0}
+            default_weight: weights 中没有的表的耗时
+
+        Returns:
+            (关键路径上的节点列表, 总耗时)，空图返回 ([], 0)
+
+        Raises:
+            CycleDetectedException: 图中存在环
+        """
+        weights = weights or {}
+        finish_time = {}
+        previous = {}
+        for node in self.topological_order():
+            start_time = 0.0
+            upstreams = self.__reverse_adjacency_list[node]
+            if upstreams:
+                # 完成时间相同时取名称最小的上游，结果稳定
+                previous[node] = min(upstreams, key=lambda upstream: (-finish_time[upstream], upstream))
+                start_time = finish_time[previous[node]]
+            finish_time[node] = start_time + weights.get(node, default_weight)
+
+        if not finish_time:
+            return [], 0
+
+        end_node = max(sorted(finish_time), key=finish_time.__getitem__)
+        path = [end_node]
+        while path[-1] in previous:
+            path.append(previous[path[-1]])
+        path.reverse()
+        return path, finish_time[end_node]
 
     def _get_mermaid_str(self, edges: set, direction="LR") -> str:
         """
@@ -207,28 +997,38 @@ class DagGraph:
         Returns:
             Mermaid格式的图描述字符串
         """
-        # edges = list(self.__edges)
-        mermaid_str = f"graph {direction}\n"
-        if not edges:
-            return mermaid_str
+        buffer = io.StringIO()
+        write_mermaid(buffer, edges, direction=direction)
+        return buffer.getvalue()
 
-        for _from, _to in edges:
-            mermaid_str += f"    {_from} --> {_to}\n"
-        return mermaid_str
+    def export(self, file: str | Path | TextIO, format: str = "mermaid", edges: set | None = None, **options) -> None:
+        """
+        将图逐行写出到文件，边和节点按名称排序
+
+        Args:
+            file: 文件路径或文本文件对象
+            format: mermaid、dot、graphml 或 html
+            edges: 只导出指定的边，默认导出所有边和所有节点（包括孤立节点）
+            **options: direction、cluster_by_schema（按库名分组）等，见 export 模块中对应的写出函数
+        """
+        if edges is None:
+            export_graph(file, self.__edges, self.__nodes, format, **options)
+        else:
+            export_graph(file, edges, (), format, **options)
 
     def print_all_edges_to_mermaid(self) -> None:
         """
         输出所有边到Mermaid格式的图描述字符串
         """
-        mermaid_str = self._get_mermaid_str(self.__edges)
-        print(mermaid_str)
+        write_mermaid(sys.stdout, self.__edges)
+        print()
 
     def print_edges_to_mermaid(self, edges: set) -> None:
         """
         输出指定边到Mermaid格式的图描述字符串
         """
-        mermaid_str = self._get_mermaid_str(edges)
-        print(mermaid_str)
+        write_mermaid(sys.stdout, edges)
+        print()
 
     def find_related_edges_downstream(self, node: str) -> set:
         """
@@ -243,23 +1043,20 @@ class DagGraph:
         if node not in self.__nodes:
             return set()
 
-        from collections import deque
-
         queue = deque([node])
         visited = set([node])
-        all_relations = []
+        all_relations = set()
 
         while queue:
             current = queue.popleft()
-            # 找到当前节点作为起点的所有边
-            for edge in self.__edges:
-                if edge[0] == current:
-                    all_relations.append(edge)
-                    if edge[1] not in visited:
-                        visited.add(edge[1])
-                        queue.append(edge[1])
+            # 通过邻接表找到当前节点作为起点的所有边
+            for downstream in self.__adjacency_list[current]:
+                all_relations.add((current, downstream))
+                if downstream not in visited:
+                    visited.add(downstream)
+                    queue.append(downstream)
 
-        return set(all_relations)
+        return all_relations
 
     def find_related_edges_upstream(self, node: str) -> set:
         """
@@ -274,23 +1071,539 @@ class DagGraph:
         if node not in self.__nodes:
             return set()
 
-        from collections import deque
-
         queue = deque([node])
         visited = set([node])
-        all_relations = []
+        all_relations = set()
+
+        while queue:
+            current = queue.popleft()
+            # 通过反向邻接表找到当前节点作为终点的所有边
+            for upstream in self.__reverse_adjacency_list[current]:
+                all_relations.add((upstream, current))
+                if upstream not in visited:
+                    visited.add(upstream)
+                    queue.append(upstream)
+
+        return all_relations
+
+    def find_related_edges(
+        self,
+        nodes: Iterable[str],
+        direction: str = "downstream",
+        max_depth: int | None = None,
+        node_filter: Callable[[str], bool] | None = None,
+    ) -> dict:
+        """
+        从多个起始节点同时出发，一次遍历查找相关的边，适合一次变更涉及多张表的影响分析
+
+        Args:
+            nodes: 起始节点，不存在的节点会被忽略
+            direction: downstream 查找下游，upstream 查找上游
+            max_depth: 最多向外查找的跳数，默认不限
+            node_filter: 节点过滤函数，如 lambda node: node.startswith("dw.")，返回 False 的节点不纳入结果也不再经过它继续查找，
+                起始节点不受过滤
+
+        Returns:
+            {(from, to): 距离}，距离为经过该边到达的节点与最近的起始节点之间的跳数，从 1 开始
+        """
+        if direction == "downstream":
+            adjacency_list = self.__adjacency_list
+        elif direction == "upstream":
+            adjacency_list = self.__reverse_adjacency_list
+        else:
+            raise ValueError(f"不支持的查找方向: {direction}, 可选: downstream, upstream")
+
+        distances = {node: 0 for node in nodes if node in self.__nodes}
+        rejected = set()
+        queue = deque(distances)
+        related_edges = {}
+
+        while queue:
+            current = queue.popleft()
+            depth = distances[current] + 1
+            if max_depth is not None and depth > max_depth:
+                # 广度优先，之后的节点距离都不会更小
+                break
+            for neighbor in adjacency_list[current]:
+                if neighbor not in distances:
+                    if neighbor in rejected:
+                        continue
+                    if node_filter is not None and not node_filter(neighbor):
+                        rejected.add(neighbor)
+                        continue
+                    distances[neighbor] = depth
+                    queue.append(neighbor)
+                edge = (current, neighbor) if adjacency_list is self.__adjacency_list else (neighbor, current)
+                related_edges[edge] = depth
+
+        return related_edges
+
+    def get_mermaidjs_dag(self, title: str = "DAG Visualization") -> str:
+        """
+        生成包含Mermaid.js可视化的HTML代码
+
+        Args:
+            title: HTML页面标题
+
+        Returns:
+            包含Mermaid.js可视化的HTML字符串
+        """
+        buffer = io.StringIO()
+        write_mermaidjs_html(buffer, self.__edges, title=title)
+        return buffer.getvalue()
+
+
+class FrozenDagGraph:
+    """
+    只读的紧凑DAG图
+
+    节点名按字典序映射为整数ID，每个节点名只保存一份；正向和反向邻接关系分别以CSR形式存储在
+    `array` 中：`offsets[i]:offsets[i + 1]` 为节点 i 的邻居在 `targets` 中的范围。
+    查询接口与 DagGraph 一致，由 DagGraph.freeze() 构建。
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), edges: Iterable[tuple] = ()) -> None:
+        """
+        Args:
+            nodes: 节点集合
+            edges: 边集合，每个元素为 (from, to) 元组，边的端点会自动加入节点
+        """
+        names = set(nodes)
+        successors = {}
+        predecessors = {}
+        for _from, _to in edges:
+            successors.setdefault(_from, set()).add(_to)
+            predecessors.setdefault(_to, set()).add(_from)
+        names.update(successors)
+        names.update(predecessors)
+        self.__build(names, successors, predecessors)
+
+    @classmethod
+    def _from_adjacency(cls, nodes: Iterable[str], successors: dict, predecessors: dict) -> "FrozenDagGraph":
+        """直接由正反邻接表构建，省去按边分组，节点需包含所有边的端点"""
+        graph = cls.__new__(cls)
+        graph.__build(nodes, successors, predecessors)
+        return graph
+
+    def __build(self, names: Iterable[str], successors: dict, predecessors: dict) -> None:
+        """节点名映射为整数ID并构建正反CSR数组"""
+        self.__names = sorted(names)
+        self.__ids = {name: node_id for node_id, name in enumerate(self.__names)}
+        self.__out_offsets, self.__out_targets = self.__build_csr(self.__names, self.__ids, successors)
+        self.__in_offsets, self.__in_targets = self.__build_csr(self.__names, self.__ids, predecessors)
+        self.__reset_indexes()
+
+    def __reset_indexes(self) -> None:
+        """可达性索引和弱连通分量在第一次查询时构建，图只读，构建后一直有效"""
+        self.__reachability = None
+        self.__weak_components = None
+        self.__weak_component_of = None
+
+    @staticmethod
+    def __build_csr(names: list, ids: dict, adjacency: dict) -> tuple[array, array]:
+        """由邻接表构建CSR数组，每个节点的邻居按ID排序"""
+        offsets = array("q", [0])
+        targets = array("i")
+        for name in names:
+            neighbors = adjacency.get(name)
+            if neighbors:
+                targets.extend(sorted([ids[neighbor] for neighbor in neighbors]))
+            offsets.append(len(targets))
+        return offsets, targets
+
+    def __len__(self) -> int:
+        return len(self.__names)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self.__ids
+
+    def node_id(self, node: str) -> int:
+        """
+        获取节点的整数ID
+
+        Raises:
+            NodeNotFoundException: 节点不存在
+        """
+        try:
+            return self.__ids[node]
+        except KeyError:
+            raise NodeNotFoundException(f"节点不存在:{node}") from None
+
+    def node_name(self, node_id: int) -> str:
+        """获取整数ID对应的节点名"""
+        return self.__names[node_id]
+
+    def successor_ids(self, node_id: int) -> array:
+        """获取节点下游邻居的ID"""
+        return self.__out_targets[self.__out_offsets[node_id] : self.__out_offsets[node_id + 1]]
+
+    def predecessor_ids(self, node_id: int) -> array:
+        """获取节点上游邻居的ID"""
+        return self.__in_targets[self.__in_offsets[node_id] : self.__in_offsets[node_id + 1]]
+
+    def __iter_id_edges(self):
+        """按ID顺序遍历所有边"""
+        offsets, targets = self.__out_offsets, self.__out_targets
+        for node_id in range(len(self.__names)):
+            for index in range(offsets[node_id], offsets[node_id + 1]):
+                yield node_id, targets[index]
+
+    def get_nodes(self) -> list:
+        """
+        获取所有节点（按字母排序）
+
+        Returns:
+            节点列表
+        """
+        return list(self.__names)
+
+    def get_edges(self) -> list:
+        """
+        获取所有边
+
+        Returns:
+            边列表，每个元素为 (from, to) 元组
+        """
+        names = self.__names
+        return [(names[_from], names[_to]) for _from, _to in self.__iter_id_edges()]
+
+    def has_cycle(self) -> list:
+        """
+        检测图中是否存在环（Kahn 拓扑排序，不递归），存在环时再给出环路径
+
+        Returns:
+            环路径列表，与 DagGraph.has_cycle 相同；无环时返回空列表
+        """
+        node_count = len(self.__names)
+        offsets, targets = self.__out_offsets, self.__out_targets
+        in_degree = array("q", bytes(8 * node_count))
+        for target in targets:
+            in_degree[target] += 1
+        stack = [node_id for node_id in range(node_count) if not in_degree[node_id]]
+        removed = 0
+        while stack:
+            node_id = stack.pop()
+            removed += 1
+            for index in range(offsets[node_id], offsets[node_id + 1]):
+                target = targets[index]
+                in_degree[target] -= 1
+                if not in_degree[target]:
+                    stack.append(target)
+        if removed == node_count:
+            return []
+        return self.thaw().has_cycle()
+
+    def __in_degrees(self) -> list:
+        """每个节点的入度，按ID排列"""
+        offsets = self.__in_offsets
+        return [offsets[node_id + 1] - offsets[node_id] for node_id in range(len(self.__names))]
+
+    def __raise_cycle(self, in_degree: list) -> None:
+        """拓扑排序未能移除所有节点时，剩余节点中必然存在环"""
+        remaining = [self.__names[node_id] for node_id, degree in enumerate(in_degree) if degree > 0]
+        raise CycleDetectedException(f"图中存在环，无法排序的节点（环及其下游）: {', '.join(remaining)}")
+
+    def __topological_ids(self) -> list:
+        """拓扑排序，返回节点ID，ID按名称分配，按ID取最小即按名称取最小"""
+        offsets, targets = self.__out_offsets, self.__out_targets
+        in_degree = self.__in_degrees()
+        # 升序列表本身就是合法的堆
+        ready = [node_id for node_id, degree in enumerate(in_degree) if not degree]
+        order = []
+        while ready:
+            node_id = heapq.heappop(ready)
+            order.append(node_id)
+            for target in targets[offsets[node_id] : offsets[node_id + 1]]:
+                in_degree[target] -= 1
+                if not in_degree[target]:
+                    heapq.heappush(ready, target)
+
+        if len(order) != len(self.__names):
+            self.__raise_cycle(in_degree)
+        return order
+
+    def topological_order(self) -> list:
+        """
+        拓扑排序，结果与 DagGraph.topological_order 相同
+
+        Raises:
+            CycleDetectedException: 图中存在环
+        """
+        names = self.__names
+        return [names[node_id] for node_id in self.__topological_ids()]
+
+    def execution_levels(self) -> list:
+        """
+        按层划分可并行执行的表，结果与 DagGraph.execution_levels 相同
+
+        Raises:
+            CycleDetectedException: 图中存在环
+        """
+        names, offsets, targets = self.__names, self.__out_offsets, self.__out_targets
+        in_degree = self.__in_degrees()
+        level = [node_id for node_id, degree in enumerate(in_degree) if not degree]
+        levels = []
+        visited_count = 0
+        while level:
+            levels.append([names[node_id] for node_id in level])
+            visited_count += len(level)
+            next_level = []
+            for node_id in level:
+                for target in targets[offsets[node_id] : offsets[node_id + 1]]:
+                    in_degree[target] -= 1
+                    if not in_degree[target]:
+                        next_level.append(target)
+            level = sorted(next_level)
+
+        if visited_count != len(names):
+            self.__raise_cycle(in_degree)
+        return levels
+
+    def critical_path(self, weights: dict | None = None, default_weight: float = 1.0) -> tuple[list, float]:
+        """
+        计算关键路径，参数和结果与 DagGraph.critical_path 相同
+
+        Raises:
+            CycleDetectedException: 图中存在环
+        """
+        names, offsets, sources = self.__names, self.__in_offsets, self.__in_targets
+        if not names:
+            return [], 0
+        weights = weights or {}
+        finish_time = [0.0] * len(names)
+        previous = [-1] * len(names)
+        for node_id in self.__topological_ids():
+            start_time = 0.0
+            upstreams = sources[offsets[node_id] : offsets[node_id + 1]]
+            if upstreams:
+                # 完成时间相同时取名称（ID）最小的上游，结果稳定
+                previous[node_id] = min(upstreams, key=lambda upstream: (-finish_time[upstream], upstream))
+                start_time = finish_time[previous[node_id]]
+            finish_time[node_id] = start_time + weights.get(names[node_id], default_weight)
+
+        end_id = max(range(len(names)), key=finish_time.__getitem__)
+        path = [end_id]
+        while previous[path[-1]] != -1:
+            path.append(previous[path[-1]])
+        return [names[node_id] for node_id in reversed(path)], finish_time[end_id]
+
+    def build_reachability_index(self) -> ReachabilityIndex:
+        """
+        构建（或返回已构建的）可达性索引，内存开销见 DagGraph.build_reachability_index
+
+        Returns:
+            ReachabilityIndex 对象
+        """
+        if self.__reachability is None:
+            names, offsets, targets = self.__names, self.__out_offsets, self.__out_targets
+            components = _strongly_connected_components(range(len(names)), self.successor_ids)
+            # 索引按节点名查询，邻接表只在构建时使用
+            adjacency_list = {
+                names[node_id]: [names[target] for target in targets[offsets[node_id] : offsets[node_id + 1]]]
+                for node_id in range(len(names))
+            }
+            self.__reachability = ReachabilityIndex(
+                [[names[node_id] for node_id in component] for component in components], adjacency_list
+            )
+        return self.__reachability
+
+    is_upstream = DagGraph.is_upstream
+    upstream_set = DagGraph.upstream_set
+    downstream_set = DagGraph.downstream_set
+
+    def strongly_connected_components(self) -> list:
+        """
+        计算强连通分量，结果与 DagGraph.strongly_connected_components 相同
+        """
+        names = self.__names
+        components = [
+            [names[node_id] for node_id in sorted(component)]
+            for component in _strongly_connected_components(range(len(names)), self.successor_ids)
+        ]
+        return sorted(components, key=lambda component: (-len(component), component[0]))
+
+    def __build_weak_components(self) -> None:
+        """忽略边的方向，按正反CSR数组广度优先划分弱连通分量，分量以节点ID列表保存"""
+        out_offsets, out_targets = self.__out_offsets, self.__out_targets
+        in_offsets, in_targets = self.__in_offsets, self.__in_targets
+        component_of = [-1] * len(self.__names)
+        components = []
+        for root in range(len(component_of)):
+            if component_of[root] != -1:
+                continue
+            index = len(components)
+            component_of[root] = index
+            # 列表在遍历过程中追加，即广度优先的队列
+            members = [root]
+            for node_id in members:
+                for neighbors in (
+                    out_targets[out_offsets[node_id] : out_offsets[node_id + 1]],
+                    in_targets[in_offsets[node_id] : in_offsets[node_id + 1]],
+                ):
+                    for neighbor in neighbors:
+                        if component_of[neighbor] == -1:
+                            component_of[neighbor] = index
+                            members.append(neighbor)
+            components.append(sorted(members))
+        self.__weak_components = components
+        self.__weak_component_of = component_of
+
+    def weakly_connected_components(self) -> list:
+        """
+        计算弱连通分量（忽略边的方向），结果与 DagGraph.weakly_connected_components 相同
+        """
+        if self.__weak_components is None:
+            self.__build_weak_components()
+        names = self.__names
+        components = [[names[node_id] for node_id in component] for component in self.__weak_components]
+        return sorted(components, key=lambda component: (-len(component), component[0]))
+
+    def component_of(self, node: str) -> list:
+        """
+        获取节点所在的弱连通分量
+
+        Raises:
+            NodeNotFoundException: 节点不存在
+        """
+        node_id = self.node_id(node)
+        if self.__weak_components is None:
+            self.__build_weak_components()
+        names = self.__names
+        return [names[member] for member in self.__weak_components[self.__weak_component_of[node_id]]]
+
+    def get_component_edges(self, nodes: Iterable[str]) -> set:
+        """
+        获取分量内部的所有边，只访问分量中节点的邻接关系
+        """
+        names, ids, offsets, targets = self.__names, self.__ids, self.__out_offsets, self.__out_targets
+        node_ids = {ids[node] for node in nodes if node in ids}
+        return {
+            (names[node_id], names[target])
+            for node_id in node_ids
+            for target in targets[offsets[node_id] : offsets[node_id + 1]]
+            if target in node_ids
+        }
+
+    export_components = DagGraph.export_components
+
+    @staticmethod
+    def __bfs_ids(node_id: int, offsets: array, targets: array) -> list:
+        """按CSR数组广度优先遍历，返回按访问顺序排列的节点ID"""
+        visited = bytearray(len(offsets) - 1)
+        visited[node_id] = 1
+        # 列表在遍历过程中追加，即广度优先的队列
+        queue = [node_id]
+        for current in queue:
+            for neighbor in targets[offsets[current] : offsets[current + 1]]:
+                if not visited[neighbor]:
+                    visited[neighbor] = 1
+                    queue.append(neighbor)
+        return queue
+
+    def find_related_edges_downstream(self, node: str) -> set:
+        """
+        后向查找与节点相关的所有边（查找所有下游依赖）
+
+        Args:
+            node: 起始节点
+
+        Returns:
+            相关边的集合
+        """
+        node_id = self.__ids.get(node)
+        if node_id is None:
+            return set()
+
+        names, offsets, targets = self.__names, self.__out_offsets, self.__out_targets
+        return {
+            (names[current], names[target])
+            for current in self.__bfs_ids(node_id, offsets, targets)
+            for target in targets[offsets[current] : offsets[current + 1]]
+        }
+
+    def find_related_edges_upstream(self, node: str) -> set:
+        """
+        前向查找与节点相关的所有边（查找所有上游依赖）
+
+        Args:
+            node: 目标节点
+
+        Returns:
+            相关边的集合
+        """
+        node_id = self.__ids.get(node)
+        if node_id is None:
+            return set()
+
+        names, offsets, targets = self.__names, self.__in_offsets, self.__in_targets
+        return {
+            (names[source], names[current])
+            for current in self.__bfs_ids(node_id, offsets, targets)
+            for source in targets[offsets[current] : offsets[current + 1]]
+        }
+
+    def find_related_edges(
+        self,
+        nodes: Iterable[str],
+        direction: str = "downstream",
+        max_depth: int | None = None,
+        node_filter: Callable[[str], bool] | None = None,
+    ) -> dict:
+        """
+        从多个起始节点同时出发，一次遍历查找相关的边，参数和返回值与 DagGraph.find_related_edges 相同
+        """
+        if direction == "downstream":
+            offsets, targets, downstream = self.__out_offsets, self.__out_targets, True
+        elif direction == "upstream":
+            offsets, targets, downstream = self.__in_offsets, self.__in_targets, False
+        else:
+            raise ValueError(f"不支持的查找方向: {direction}, 可选: downstream, upstream")
+
+        names, ids = self.__names, self.__ids
+        distances = {ids[node]: 0 for node in nodes if node in ids}
+        rejected = set()
+        queue = deque(distances)
+        related_edges = {}
 
         while queue:
             current = queue.popleft()
-            # 找到当前节点作为终点的所有边
-            for edge in self.__edges:
-                if edge[1] == current:
-                    all_relations.append(edge)
-                    if edge[0] not in visited:
-                        visited.add(edge[0])
-                        queue.append(edge[0])
+            depth = distances[current] + 1
+            if max_depth is not None and depth > max_depth:
+                break
+            for neighbor in targets[offsets[current] : offsets[current + 1]]:
+                if neighbor not in distances:
+                    if neighbor in rejected:
+                        continue
+                    if node_filter is not None and not node_filter(names[neighbor]):
+                        rejected.add(neighbor)
+                        continue
+                    distances[neighbor] = depth
+                    queue.append(neighbor)
+                if downstream:
+                    related_edges[(names[current], names[neighbor])] = depth
+                else:
+                    related_edges[(names[neighbor], names[current])] = depth
+
+        return related_edges
+
+    _get_mermaid_str = DagGraph._get_mermaid_str
+    print_edges_to_mermaid = DagGraph.print_edges_to_mermaid
+
+    def export(self, file: str | Path | TextIO, format: str = "mermaid", edges: set | None = None, **options) -> None:
+        """
+        将图逐行写出到文件，参数与 DagGraph.export 相同
+        """
+        if edges is None:
+            export_graph(file, self.get_edges(), self.__names, format, **options)
+        else:
+            export_graph(file, edges, (), format, **options)
 
-        return set(all_relations)
+    def print_all_edges_to_mermaid(self) -> None:
+        """
+        输出所有边到Mermaid格式的图描述字符串
+        """
+        write_mermaid(sys.stdout, self.get_edges())
+        print()
 
     def get_mermaidjs_dag(self, title: str = "DAG Visualization") -> str:
         """
@@ -302,26 +1615,120 @@ class DagGraph:
         Returns:
             包含Mermaid.js可视化的HTML字符串
         """
-        # 获取Mermaid图描述
-        mermaid_content = self._get_mermaid_str(self.__edges)
-
-        html_content = f"""<!DOCTYPE html>
-    <html lang="zh-CN">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>{title}</title>
-        <script type="module">
-        import mermaid from 'https://cdn.jsdelivr.net/npm/mermaid@11/dist/mermaid.esm.min.mjs';
-        mermaid.initialize({{ startOnLoad: true }});
-        </script>
-
-    </head>
-    <body>
-        <div class="mermaid">
-        {mermaid_content}
-        </div>
-    </body>
-    </html>"""
-
-        return html_content
+        buffer = io.StringIO()
+        write_mermaidjs_html(buffer, self.get_edges(), title=title)
+        return buffer.getvalue()
+
+    def save(self, path: str | Path) -> None:
+        """
+        保存为带版本号的二进制快照，不使用 pickle，节点名只保存一次，邻接关系直接写出CSR数组
+
+        Args:
+            path: 文件路径
+        """
+        names = "\0".join(self.__names).encode("utf-8")
+        header = _SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC,
+            SNAPSHOT_VERSION,
+            0 if sys.byteorder == "little" else 1,
+            len(self.__names),
+            len(self.__out_targets),
+            len(names),
+        )
+        with open(path, "wb") as f:
+            for block in (header, names, self.__out_offsets, self.__out_targets, self.__in_offsets, self.__in_targets):
+                f.write(block)
+                f.write(bytes(-f.tell() % 8))
+
+    @classmethod
+    def load(cls, path: str | Path, use_mmap: bool = False) -> "FrozenDagGraph":
+        """
+        加载二进制快照，数组按字节直接读入，不逐条解析
+
+        Args:
+            path: 文件路径
+            use_mmap: 是否以只读 mmap 映射文件，数组直接引用映射的内存，按需从磁盘读取（字节序与本机不同时退化为复制）
+
+        Returns:
+            FrozenDagGraph 对象
+
+        Raises:
+            ValueError: 文件不是快照、版本不支持或内容不完整
+        """
+        with open(path, "rb") as f:
+            if use_mmap:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = f.read()
+
+        if len(data) < _SNAPSHOT_HEADER.size:
+            raise ValueError(f"不是 DagGraph 快照文件: {path}")
+        magic, version, byte_order, node_count, edge_count, names_size = _SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"不是 DagGraph 快照文件: {path}")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"不支持的快照版本: {version}, 当前版本: {SNAPSHOT_VERSION}")
+        swap = byte_order != (0 if sys.byteorder == "little" else 1)
+
+        # 各数据块按8字节对齐，文件长度不足时说明快照被截断
+        expected_size = _SNAPSHOT_HEADER.size
+        for block_size in (
+            names_size,
+            (node_count + 1) * array("q").itemsize,
+            edge_count * array("i").itemsize,
+            (node_count + 1) * array("q").itemsize,
+            edge_count * array("i").itemsize,
+        ):
+            expected_size += -expected_size % 8 + block_size
+        if len(data) < expected_size:
+            raise ValueError(f"快照文件不完整: {path}, 需要 {expected_size} 字节, 实际 {len(data)} 字节")
+
+        view = memoryview(data)
+        position = _SNAPSHOT_HEADER.size
+
+        def read_block(size: int) -> memoryview:
+            nonlocal position
+            position += -position % 8
+            block = view[position : position + size]
+            if len(block) != size:
+                raise ValueError(f"快照文件不完整: {path}")
+            position += size
+            return block
+
+        def read_array(typecode: str, length: int):
+            block = read_block(length * array(typecode).itemsize)
+            if use_mmap and not swap:
+                return block.cast(typecode)
+            values = array(typecode)
+            values.frombytes(block)
+            if swap:
+                values.byteswap()
+            return values
+
+        names_block = read_block(names_size)
+        names = str(names_block, "utf-8").split("\0") if node_count else []
+        if len(names) != node_count:
+            raise ValueError(f"快照文件已损坏: {path}, 节点名数量 {len(names)} 与节点数 {node_count} 不一致")
+        graph = cls.__new__(cls)
+        graph.__names = names
+        graph.__ids = {name: node_id for node_id, name in enumerate(names)}
+        graph.__out_offsets = read_array("q", node_count + 1)
+        graph.__out_targets = read_array("i", edge_count)
+        graph.__in_offsets = read_array("q", node_count + 1)
+        graph.__in_targets = read_array("i", edge_count)
+        if graph.__out_offsets[-1] != edge_count or graph.__in_offsets[-1] != edge_count:
+            raise ValueError(f"快照文件已损坏: {path}, 邻接数组与边数 {edge_count} 不一致")
+        graph.__reset_indexes()
+        return graph
+
+    def thaw(self) -> DagGraph:
+        """
+        转换回可修改的 DagGraph（不含边的来源记录）
+
+        Returns:
+            DagGraph 对象
+        """
+        dg = DagGraph(self.__names)
+        for _from, _to in self.get_edges():
+            dg.add_edge(_from, _to)
+        return dg
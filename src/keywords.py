@@ -1,62 +1,169 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class KeyWordProfile:
+    """
+    某个SQL方言的关键字表，全部为大写的 frozenset，解析时对每个单词只做一次大写转换和哈希查找
+    """
+
+    name: str
+    keywords: frozenset
+    insert_keywords: frozenset
+    from_keywords: frozenset
+    table_function_keywords: frozenset
+
+
 class KeyWords:
-    keywords = [
-        "SELECT",
-        "INSERT",
-        "DELETE",
-        "UPDATE",
-        "UPSERT",
-        "REPLACE",
-        "DROP",
-        "CREATE",
-        "ALTER",
-        "TRUNCATE",
-        "WHERE",
-        "FROM",
-        "INNER",
-        "JOIN",
-        "AND",
-        "ON",
-        "OR",
-        "LIKE",
-        "IN",
-        "SET",
-        "BY",
-        "GROUP",
-        "ORDER",
-        "LEFT",
-        "OUTER",
-        "FULL",
-        "RIGHT",
-        "IF",
-        "END",
-        "THEN",
-        "AS",
-        "ELSE",
-        "CASE",
-        "WHEN",
-        "DISTINCT",
-        "OVERWRITE",
-        "TABLE",
-        "OVER",
-        "INTO",
-        "VIEW",
-        "NOT",
-        "EXISTS",
-        "EXTERNAL",
-        "WITH",
-        "DATABASE",
-        "TEMPORARY",
-        "MERGE",
-    ]
-
-    insert_keywords = [
-        "INSERT",
-        "CREATE",
-    ]
-
-    from_keywords = [
-        "FROM",
-        "JOIN",
-    ]
-
-    table_function_keywords = ["UNNEST", "LATERAL", "GENERATE_SERIES", "SEQUENCE"]
+    keywords = frozenset(
+        {
+            "SELECT",
+            "INSERT",
+            "DELETE",
+            "UPDATE",
+            "UPSERT",
+            "REPLACE",
+            "DROP",
+            "CREATE",
+            "ALTER",
+            "TRUNCATE",
+            "WHERE",
+            "FROM",
+            "INNER",
+            "JOIN",
+            "AND",
+            "ON",
+            "OR",
+            "LIKE",
+            "IN",
+            "SET",
+            "BY",
+            "GROUP",
+            "ORDER",
+            "LEFT",
+            "OUTER",
+            "FULL",
+            "RIGHT",
+            "IF",
+            "END",
+            "THEN",
+            "AS",
+            "ELSE",
+            "CASE",
+            "WHEN",
+            "DISTINCT",
+            "OVERWRITE",
+            "TABLE",
+            "OVER",
+            "INTO",
+            "VIEW",
+            "NOT",
+            "EXISTS",
+            "EXTERNAL",
+            "WITH",
+            "DATABASE",
+            "TEMPORARY",
+            "MERGE",
+        }
+    )
+
+    insert_keywords = frozenset(
+        {
+            "INSERT",
+            "CREATE",
+        }
+    )
+
+    from_keywords = frozenset(
+        {
+            "FROM",
+            "JOIN",
+        }
+    )
+
+    table_function_keywords = frozenset({"UNNEST", "LATERAL", "GENERATE_SERIES", "SEQUENCE"})
+
+    # 各方言在通用关键字之外追加的关键字
+    dialect_keywords = {
+        "hive": {
+            "keywords": {"PARTITION", "LOCAL", "DIRECTORY", "DISTRIBUTE", "CLUSTER", "SORT", "LIMIT"},
+            "table_function_keywords": {"EXPLODE", "POSEXPLODE", "INLINE", "STACK"},
+        },
+        "spark": {
+            "keywords": {"PARTITION", "LOCAL", "DIRECTORY", "DISTRIBUTE", "CLUSTER", "SORT", "LIMIT"},
+            "table_function_keywords": {"EXPLODE", "POSEXPLODE", "INLINE", "STACK", "RANGE"},
+        },
+        "mysql": {
+            "keywords": {"IGNORE", "DUAL", "LIMIT"},
+            "from_keywords": {"STRAIGHT_JOIN"},
+            "table_function_keywords": {"JSON_TABLE"},
+        },
+        "trino": {
+            "keywords": {"LIMIT", "OFFSET", "FETCH", "TABLESAMPLE"},
+        },
+    }
+
+    __profiles = {}
+
+    @classmethod
+    def register_dialect(
+        cls,
+        dialect: str,
+        keywords=(),
+        insert_keywords=(),
+        from_keywords=(),
+        table_function_keywords=(),
+    ) -> None:
+        """
+        注册方言（或为已有方言追加关键字），关键字不区分大小写
+
+        Args:
+            dialect: 方言名称
+            keywords: 追加的关键字
+            insert_keywords: 追加的写入关键字，其后为目标表
+            from_keywords: 追加的读取关键字，其后为来源表
+            table_function_keywords: 追加的表函数关键字
+        """
+        dialect = dialect.lower()
+        extra = cls.dialect_keywords.setdefault(dialect, {})
+        for kind, words in (
+            ("keywords", keywords),
+            ("insert_keywords", insert_keywords),
+            ("from_keywords", from_keywords),
+            ("table_function_keywords", table_function_keywords),
+        ):
+            if words:
+                extra[kind] = set(extra.get(kind, ())) | {word.upper() for word in words}
+        cls.__profiles.pop(dialect, None)
+
+    @classmethod
+    def for_dialect(cls, dialect: str | None = None) -> KeyWordProfile:
+        """
+        获取方言的关键字表，结果会被缓存
+
+        Args:
+            dialect: 方言名称，如 hive、spark、mysql、trino，默认只使用通用关键字
+
+        Returns:
+            关键字表
+
+        Raises:
+            ValueError: 未注册的方言
+        """
+        name = dialect.lower() if dialect else "default"
+        profile = cls.__profiles.get(name)
+        if profile is not None:
+            return profile
+
+        if dialect and name not in cls.dialect_keywords:
+            raise ValueError(f"不支持的方言: {dialect}, 可选: {', '.join(sorted(cls.dialect_keywords))}")
+        extra = cls.dialect_keywords.get(name, {})
+        profile = KeyWordProfile(
+            name=name,
+            keywords=cls.keywords | frozenset(extra.get("keywords", ())),
+            insert_keywords=cls.insert_keywords | frozenset(extra.get("insert_keywords", ())),
+            from_keywords=cls.from_keywords | frozenset(extra.get("from_keywords", ())),
+            table_function_keywords=cls.table_function_keywords | frozenset(extra.get("table_function_keywords", ())),
+        )
+        cls.__profiles[name] = profile
+        return profile
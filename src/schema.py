@@ -0,0 +1,235 @@
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Iterable, Optional
+
+import sqlglot
+from sqlglot import expressions as exp
+from sqlglot.optimizer.qualify import qualify
+from sqlglot.schema import MappingSchema
+
+from .helper import SqlHelper, StatementSpan
+from .utils import iter_corpus_statements
+
+# 未声明类型的字段使用的类型
+UNKNOWN_TYPE = "UNKNOWN"
+
+# 跳过开头的空白和注释后以 CREATE 开头的语句，只检查语句开头，不扫描整条语句
+_CREATE_PATTERN = re.compile(r"(?:\s+|--[^\n]*(?:\n|$)|/\*.*?\*/)*create\b", re.IGNORECASE | re.DOTALL)
+
+
+class SchemaCatalog:
+    """
+    表结构目录
+
+    由语料中的 CREATE TABLE / CREATE VIEW 语句及 JSON 表结构文件构建，按完整表名索引字段。
+    提供给字段血缘的表别名限定使用，用于展开 `*`；同一次运行中的所有 ColumnLineageExtractor 共用同一个目录。
+    """
+
+    def __init__(self, dialect: Optional[str] = None) -> None:
+        """
+        Args:
+            dialect: SQL方言
+        """
+        self.dialect = dialect
+        # 完整表名 -> {字段名: 类型}，字段按声明顺序排列
+        self.__tables: dict[str, dict[str, str]] = {}
+        self.__mapping_schema: Optional[MappingSchema] = None
+        self.__fingerprint: Optional[str] = None
+
+    @classmethod
+    def from_file(
+        cls,
+        file_path: str,
+        include: Optional[Iterable[str]] = None,
+        exclude: Optional[Iterable[str]] = None,
+        encoding: str = "utf-8",
+        dialect: Optional[str] = None,
+    ) -> "SchemaCatalog":
+        """
+        逐个文件划分SQL语句，只解析其中的 CREATE 语句
+
+        Args:
+            file_path: 文件或目录路径，支持通配符
+            include: 目录中需要包含的文件通配符
+            exclude: 目录中需要排除的文件或目录通配符
+            encoding: 文件编码
+            dialect: SQL方言
+        """
+        catalog = cls(dialect)
+        catalog.add_spans(span for _, span in iter_corpus_statements(file_path, include, exclude, encoding))
+        return catalog
+
+    @classmethod
+    def from_json(cls, path: str | Path, dialect: Optional[str] = None) -> "SchemaCatalog":
+        """由 JSON 表结构文件构建，格式见 add_json"""
+        catalog = cls(dialect)
+        catalog.add_json(path)
+        return catalog
+
+    def __len__(self) -> int:
+        return len(self.__tables)
+
+    def __contains__(self, table: str) -> bool:
+        return table in self.__tables
+
+    @property
+    def tables(self) -> list[str]:
+        """所有表名"""
+        return list(self.__tables)
+
+    def columns(self, table: str) -> Optional[list[str]]:
+        """表的字段名，表不存在时返回 None"""
+        columns = self.__tables.get(table)
+        return None if columns is None else list(columns)
+
+    def add_table(self, table: str, columns: dict[str, str] | Iterable[str]) -> None:
+        """
+        添加或替换一张表的结构
+
+        Args:
+            table: 完整表名，如 db.table
+            columns: {字段名: 类型} 或字段名列表，未声明类型的字段类型为 UNKNOWN
+        """
+        if not isinstance(columns, dict):
+            columns = dict.fromkeys(columns, UNKNOWN_TYPE)
+        self.__tables[table] = {str(name): str(_type or UNKNOWN_TYPE) for name, _type in columns.items()}
+        self.__mapping_schema = None
+        self.__fingerprint = None
+
+    def add_sql(self, sql_stmt_str: str, source_file: str = "<string>") -> None:
+        """
+        从SQL脚本的 CREATE 语句中添加表结构
+
+        Args:
+            sql_stmt_str: SQL语句字符串
+            source_file: 脚本对应的文件路径
+        """
+        self.add_spans(SqlHelper.split_spans(sql_stmt_str, source_file, dialect=self.dialect))
+
+    def add_spans(self, spans: Iterable[StatementSpan | str]) -> None:
+        """从语句中添加表结构，非 CREATE 语句不调用 sqlglot 解析，无法解析的语句跳过"""
+        star_queries = []
+        for span in spans:
+            sql = span if isinstance(span, str) else span.text
+            if not _CREATE_PATTERN.match(sql):
+                continue
+            try:
+                ast = sqlglot.parse_one(sql, read=self.dialect)
+            except Exception:
+                continue
+            if isinstance(ast, exp.Create):
+                self.__add_create(ast, star_queries)
+        self.__add_star_queries(star_queries)
+
+    def __add_create(self, node: exp.Create, star_queries: list) -> None:
+        """
+        由 CREATE TABLE (...) 的字段定义或 CREATE TABLE/VIEW ... AS SELECT 的输出字段添加表结构
+
+        输出字段包含 `*` 的查询放入 star_queries，等所有语句处理完后再展开
+        """
+        table_node = node.this.this if isinstance(node.this, exp.Schema) else node.this
+        if not isinstance(table_node, exp.Table):
+            return
+
+        if isinstance(node.this, exp.Schema):
+            columns = {}
+            for column_def in node.this.expressions:
+                if isinstance(column_def, exp.ColumnDef):
+                    kind = column_def.args.get("kind")
+                    columns[column_def.name] = kind.sql(dialect=self.dialect) if kind else UNKNOWN_TYPE
+        else:
+            query = node.expression
+            if not isinstance(query, exp.Query):
+                return
+            if any(select.is_star for select in query.selects):
+                star_queries.append((table_node, query))
+                return
+            columns = dict.fromkeys(query.named_selects, UNKNOWN_TYPE)
+
+        if columns:
+            self.add_table(self.__table_name(table_node), columns)
+
+    def __add_star_queries(self, star_queries: list) -> None:
+        """
+        依赖已有的表结构展开 `*` 并添加表结构
+
+        每一轮只构建一次 MappingSchema，展开本轮能展开的查询后统一添加；
+        依赖其他 `*` 查询结果的表在后续轮次中展开，没有新的表可以展开时结束
+        """
+        while star_queries:
+            schema = self.mapping_schema
+            resolved, remaining = [], []
+            for table_node, query in star_queries:
+                try:
+                    expanded = qualify(query.copy(), dialect=self.dialect, schema=schema)
+                except Exception:
+                    continue
+                if any(select.is_star for select in expanded.selects):
+                    remaining.append((table_node, query))
+                else:
+                    resolved.append((table_node, expanded.named_selects))
+            if not resolved:
+                break
+            for table_node, columns in resolved:
+                self.add_table(self.__table_name(table_node), columns)
+            star_queries = remaining
+
+    @staticmethod
+    def __table_name(table_node: exp.Table) -> str:
+        """完整表名"""
+        return ".".join(part.name for part in table_node.parts)
+
+    def add_json(self, schema: str | Path | dict) -> None:
+        """
+        从 JSON 表结构文件（或已加载的字典）中添加表结构
+
+        支持以完整表名为键的扁平格式 {"db.table": {"col": "type"}}，
+        以及 sqlglot 的嵌套格式 {"db": {"table": {"col": "type"}}}；字段也可以是字段名列表
+        """
+        if not isinstance(schema, dict):
+            with open(schema, "r", encoding="utf-8") as f:
+                schema = json.load(f)
+
+        stack = [((), schema)]
+        while stack:
+            prefix, mapping = stack.pop()
+            for name, value in mapping.items():
+                path = prefix + (name,)
+                if isinstance(value, dict) and value and all(isinstance(v, dict) for v in value.values()):
+                    stack.append((path, value))
+                else:
+                    self.add_table(".".join(path), value)
+
+    def save_json(self, path: str | Path) -> None:
+        """以扁平格式保存表结构，下次运行可用 from_json 直接加载，不再解析 DDL"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.__tables, f, ensure_ascii=False, indent=2)
+
+    @property
+    def mapping_schema(self) -> MappingSchema:
+        """
+        传给 qualify 的 sqlglot MappingSchema，表结构变化前只构建一次
+
+        MappingSchema 要求所有表名层级相同，层级不足的表名在前面补空的库名
+        """
+        if self.__mapping_schema is None:
+            parts_list = [(table.split("."), columns) for table, columns in self.__tables.items()]
+            depth = max((len(parts) for parts, _ in parts_list), default=1)
+            nested: dict = {}
+            for parts, columns in parts_list:
+                node = nested
+                for part in [""] * (depth - len(parts)) + parts[:-1]:
+                    node = node.setdefault(part, {})
+                node[parts[-1]] = columns
+            self.__mapping_schema = MappingSchema(nested, dialect=self.dialect)
+        return self.__mapping_schema
+
+    @property
+    def fingerprint(self) -> str:
+        """表结构内容的哈希值，用于区分不同表结构下的缓存结果"""
+        if self.__fingerprint is None:
+            content = json.dumps(self.__tables, sort_keys=True, ensure_ascii=False)
+            self.__fingerprint = hashlib.blake2b(content.encode("utf-8"), digest_size=8).hexdigest()
+        return self.__fingerprint
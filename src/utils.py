@@ -1,73 +1,297 @@
 import glob
+import mmap
+import os
+from fnmatch import fnmatch
 from pathlib import Path
-from typing import List, Set, Tuple
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from .graph import DagGraph, EdgeSource
+from .helper import SqlHelper, StatementSpan
+
+# 超过该大小的文件使用 mmap 读取，不整体读入内存
+MMAP_THRESHOLD = 1024 * 1024
+
+
+def _matches_any(relative_path: str, patterns: Iterable[str]) -> bool:
+    """判断相对路径或文件名是否匹配任一通配符"""
+    name = relative_path.rsplit("/", 1)[-1]
+    return any(fnmatch(relative_path, pattern) or fnmatch(name, pattern) for pattern in patterns)
+
+
+def _walk_dir(
+    root: Path, include: Optional[Iterable[str]], exclude: Optional[Iterable[str]]
+) -> Iterator[Path]:
+    """按字典序递归遍历目录，排除的目录不再进入"""
+    include = list(include) if include else None
+    exclude = list(exclude) if exclude else []
+    for dir_path, dir_names, file_names in os.walk(root):
+        relative_dir = Path(dir_path).relative_to(root).as_posix()
+        prefix = "" if relative_dir == "." else relative_dir + "/"
+        dir_names[:] = sorted(name for name in dir_names if not _matches_any(prefix + name, exclude))
+        for file_name in sorted(file_names):
+            relative_path = prefix + file_name
+            if include is not None and not _matches_any(relative_path, include):
+                continue
+            if _matches_any(relative_path, exclude):
+                continue
+            yield Path(dir_path) / file_name
+
+
+def iter_sql_files(
+    file_path: str, include: Optional[Iterable[str]] = None, exclude: Optional[Iterable[str]] = None
+) -> Iterator[Path]:
+    """
+    查找SQL文件，目录会被递归遍历
+
+    Args:
+        file_path: 文件或目录路径，支持通配符
+        include: 目录中需要包含的文件通配符，按相对路径或文件名匹配，默认包含所有文件
+        exclude: 目录中需要排除的文件或目录通配符，按相对路径或文件名匹配
 
-from .graph import DagGraph
-from .helper import SqlHelper
+    Returns:
+        文件路径迭代器
+    """
+    sql_file_path = Path(file_path)
+    if sql_file_path.is_file():
+        yield sql_file_path
+    elif sql_file_path.is_dir():
+        yield from _walk_dir(sql_file_path, include, exclude)
+    elif any(char in file_path for char in ["*", "?", "["]):
+        # glob模式处理
+        for matched_path in sorted(glob.iglob(file_path, recursive=True)):
+            matched_path = Path(matched_path)
+            if matched_path.is_dir():
+                yield from _walk_dir(matched_path, include, exclude)
+            elif matched_path.is_file():
+                yield matched_path
+
+
+def _load_file(sql_file: Path, mmap_threshold: int) -> bytes | mmap.mmap:
+    """读取文件内容，大文件使用只读 mmap"""
+    with open(sql_file, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= mmap_threshold and size > 0:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return f.read()
+
+
+def iter_corpus_statements(
+    file_path: str,
+    include: Optional[Iterable[str]] = None,
+    exclude: Optional[Iterable[str]] = None,
+    encoding: str = "utf-8",
+    mmap_threshold: int = MMAP_THRESHOLD,
+) -> Iterator[Tuple[Path, StatementSpan]]:
+    """
+    逐个文件读取并划分SQL语句，按需产出 (文件路径, 语句) ，不会把所有文件拼接成一个字符串
 
+    Args:
+        file_path: 文件或目录路径，支持通配符
+        include: 目录中需要包含的文件通配符
+        exclude: 目录中需要排除的文件或目录通配符
+        encoding: 文件编码
+        mmap_threshold: 超过该字节数的文件使用 mmap 读取
 
-def read_from_file(file_path: str) -> str:
+    Returns:
+        (文件路径, StatementSpan) 迭代器，语句文本按需从文件内容中切片
+    """
+    for sql_file in iter_sql_files(file_path, include, exclude):
+        content = _load_file(sql_file, mmap_threshold)
+        for span in SqlHelper.split_spans(content, str(sql_file), encoding):
+            yield sql_file, span
+
+
+def read_from_file(
+    file_path: str,
+    include: Optional[Iterable[str]] = None,
+    exclude: Optional[Iterable[str]] = None,
+    encoding: str = "utf-8",
+) -> str:
     """
-    从文件或目录中读取SQL语句
+    从文件或目录中读取SQL语句，目录会被递归遍历
 
     Args:
         file_path: 文件路径，支持通配符
+        include: 目录中需要包含的文件通配符
+        exclude: 目录中需要排除的文件或目录通配符
+        encoding: 文件编码
 
     Returns:
         读取的SQL字符串
     """
     sql_file_path = Path(file_path)
-    sql_stmt_str = ""
-    file_lst = []
-
     if sql_file_path.is_file():
-        with open(sql_file_path, "r") as f:
+        with open(sql_file_path, "r", encoding=encoding) as f:
             return f.read()
 
-    elif sql_file_path.is_dir():
-        file_lst = list(sql_file_path.iterdir())
-
-    elif any(char in file_path for char in ["*", "?", "["]):
-        # glob模式处理
-        file_lst = glob.glob(file_path)
-
-    for sql_file in file_lst:
-        with open(sql_file, "r") as f:
+    sql_str_lst = []
+    for sql_file in iter_sql_files(file_path, include, exclude):
+        with open(sql_file, "r", encoding=encoding) as f:
             sql_str = f.read()
         if not sql_str.strip().endswith(";"):
             sql_str = sql_str + ";\n"
-        sql_stmt_str += sql_str
-    return sql_stmt_str
+        sql_str_lst.append(sql_str)
+    return "".join(sql_str_lst)
 
 
-def get_all_source_tables(sql_stmt_str: str) -> List[str]:
+class SqlCorpus:
     """
-    获取所有SQL语句中涉及的源表，包含了中间表
+    只划分和解析一次的SQL脚本，缓存每条语句的表级血缘和构建好的DAG图，供各类查询重复使用
 
-    Args:
-        sql_stmt_str: SQL语句字符串
-
-    Returns:
-        源表列表
+    语句按来源文件分组保存，DAG中的每条边都记录产生它的语句，单个文件修改后可以只撤回并重新添加该文件的边。
     """
-    sql_stmt_lst = SqlHelper.split(sql_stmt_str)
-    source_tables = set()
-
-    for sql_stmt in sql_stmt_lst:
-        table_info = SqlHelper().get_source_target_tables(sql_stmt)
-        if table_info:
-            source_tables.update(table_info["source_table"])
-
-    return list(source_tables)
 
+    def __init__(self, sql_stmt_str: str = "", dialect: Optional[str] = None, cache=None) -> None:
+        """
+        Args:
+            sql_stmt_str: SQL语句字符串
+            dialect: SQL方言
+            cache: 血缘缓存（LineageCache）
+        """
+        self.helper = SqlHelper(dialect, cache)
+        # 文件 -> [(语句行号, 语句起始偏移量, 表级血缘)]，没有解析出表的语句不保留
+        self.__file_table_infos: dict[str, List[Tuple[int, int, dict]]] = {}
+        self.__dag: Optional[DagGraph] = None
+        # 已添加的未指定来源文件的脚本数，用于生成 `<string-N>` 来源
+        self.__string_count = 0
+        if sql_stmt_str:
+            self.add_sql(sql_stmt_str)
+
+    @classmethod
+    def from_file(
+        cls,
+        file_path: str,
+        include: Optional[Iterable[str]] = None,
+        exclude: Optional[Iterable[str]] = None,
+        encoding: str = "utf-8",
+        dialect: Optional[str] = None,
+        cache=None,
+    ) -> "SqlCorpus":
+        """
+        逐个文件划分并解析SQL语句，不把所有文件拼接成一个字符串
+
+        Args:
+            file_path: 文件或目录路径，支持通配符
+            include: 目录中需要包含的文件通配符
+            exclude: 目录中需要排除的文件或目录通配符
+            encoding: 文件编码
+            dialect: SQL方言
+            cache: 血缘缓存（LineageCache）
+        """
+        corpus = cls(dialect=dialect, cache=cache)
+        for sql_file in iter_sql_files(file_path, include, exclude):
+            corpus.add_file(str(sql_file), encoding)
+        return corpus
+
+    @property
+    def table_infos(self) -> List[dict]:
+        """所有语句的表级血缘，按文件添加顺序和语句顺序排列"""
+        return [table_info for table_infos in self.__file_table_infos.values() for _, _, table_info in table_infos]
+
+    def add_sql(self, sql_stmt_str: str, source_file: Optional[str] = None) -> None:
+        """
+        添加一段SQL脚本，同一来源文件已存在时先撤回其旧的语句和边
+
+        Args:
+            sql_stmt_str: SQL语句字符串
+            source_file: 脚本对应的文件路径，作为语句来源；为空时依次使用 `<string-1>`、`<string-2>`……，
+                每次添加的脚本互不替换
+        """
+        if source_file is None:
+            self.__string_count += 1
+            source_file = f"<string-{self.__string_count}>"
+        self.__add_span_tables(source_file, self.helper.iter_span_tables(sql_stmt_str, source_file))
+
+    def add_file(self, file_path: str, encoding: str = "utf-8") -> None:
+        """
+        添加或重新加载一个SQL文件，只撤回并重新添加该文件产生的边
+
+        Args:
+            file_path: 文件路径
+            encoding: 文件编码
+        """
+        content = _load_file(Path(file_path), MMAP_THRESHOLD)
+        self.__add_span_tables(file_path, self.helper.iter_span_tables(content, file_path, encoding))
+
+    def remove_file(self, source_file: str) -> None:
+        """
+        移除一个文件的语句，并从DAG中撤回该文件产生的边
+
+        Args:
+            source_file: 文件路径
+        """
+        self.__file_table_infos.pop(source_file, None)
+        if self.__dag is not None:
+            self.__dag.retract_file(source_file)
+
+    def __add_span_tables(self, source_file: str, span_tables: Iterable[Tuple[StatementSpan, dict]]) -> None:
+        """记录语句的表级血缘，DAG已构建时增量添加边"""
+        self.remove_file(source_file)
+        table_infos = []
+        for span, table_info in span_tables:
+            if table_info:
+                table_infos.append((span.line, span.start, table_info))
+        self.__file_table_infos[source_file] = table_infos
+        if self.__dag is not None:
+            self.__add_edges(self.__dag, source_file, table_infos)
+
+    @staticmethod
+    def __add_edges(dg: DagGraph, source_file: str, table_infos: List[Tuple[int, int, dict]]) -> None:
+        """将一个文件中语句的表级血缘添加为DAG的边，并记录产生边的语句"""
+        for line, offset, table_info in table_infos:
+            source = EdgeSource(source_file, line, offset)
+            target_tables = table_info["target_table"]
+            for source_table in table_info["source_table"]:
+                for target_table in target_tables:
+                    dg.add_edge(source_table.replace("`", ""), target_table.replace("`", ""), source)
+
+    @property
+    def dag(self) -> DagGraph:
+        """由所有语句构建的DAG图，首次访问时构建，之后随文件的添加和移除增量更新"""
+        if self.__dag is None:
+            dg = DagGraph()
+            for source_file, table_infos in self.__file_table_infos.items():
+                self.__add_edges(dg, source_file, table_infos)
+            self.__dag = dg
+        return self.__dag
+
+    def _collect_tables(self) -> Tuple[Set[str], Set[str]]:
+        """
+        收集所有语句中的源表和目标表
+
+        Returns:
+            (源表集合, 目标表集合)
+        """
+        source_tables = set()
+        target_tables = set()
+        for table_info in self.table_infos:
+            for source_table in table_info["source_table"]:
+                source_tables.add(source_table.replace("`", ""))
+            for target_table in table_info["target_table"]:
+                target_tables.add(target_table.replace("`", ""))
+        return source_tables, target_tables
 
-def pretty_print_lineage(sql_stmt_str: str) -> None:
-    sql_stmt_lst = SqlHelper.split(sql_stmt_str)
-    result = {}
-    for sql_stmt in sql_stmt_lst:
-        table_info = SqlHelper().get_source_target_tables(sql_stmt)
-        # print(table_info)
-        if table_info:
+    def get_all_source_tables(self) -> List[str]:
+        """获取所有SQL语句中涉及的源表，包含了中间表"""
+        source_tables = set()
+        for table_info in self.table_infos:
+            source_tables.update(table_info["source_table"])
+        return list(source_tables)
+
+    def get_root_tables(self) -> List[str]:
+        """获取没有上游写入的底表，比如ods表，没有写入任务的表"""
+        source_tables, target_tables = self._collect_tables()
+        return list(source_tables - target_tables)
+
+    def get_leaf_tables(self) -> List[str]:
+        """获取没有下游任务的目标表，比如ads表，最下游的表"""
+        source_tables, target_tables = self._collect_tables()
+        return list(target_tables - source_tables)
+
+    def pretty_print_lineage(self) -> None:
+        """按目标表打印来源表"""
+        result = {}
+        for table_info in self.table_infos:
             source_tables = table_info.get("source_table", [])
             target_tables = table_info.get("target_table", [])
 
@@ -82,73 +306,104 @@ def pretty_print_lineage(sql_stmt_str: str) -> None:
                     if source_table_clean not in result[target_table_clean]:
                         result[target_table_clean].append(source_table_clean)
 
-    for target_table_clean, source_tables in result.items():
-        print(target_table_clean)
-        for source_table in source_tables:
-            print(f"  ├─ {source_table}")
-    return
+        for target_table_clean, source_tables in result.items():
+            print(target_table_clean)
+            for source_table in source_tables:
+                print(f"  ├─ {source_table}")
+
+    def print_mermaid_dag(self) -> None:
+        """打印DAG图（mermaid格式）"""
+        self.dag.print_all_edges_to_mermaid()
+
+    def print_related_edges_upstream(self, target_table: str) -> None:
+        """向前查找与目标表相关的表，并打印出所有相关表的DAG"""
+        related_edges = self.dag.find_related_edges_upstream(target_table)
+        self.dag.print_edges_to_mermaid(related_edges)
+
+    def print_related_edges_downstream(self, target_table: str) -> None:
+        """向后查找与目标表相关的表，并打印出所有相关表的DAG"""
+        related_edges = self.dag.find_related_edges_downstream(target_table)
+        self.dag.print_edges_to_mermaid(related_edges)
+
+    def get_related_first_source_tables_upstream(self, target_table: str) -> List[str]:
+        """查询与目标表相关的表，返回第一层原始来源表"""
+        related_edges = self.dag.find_related_edges_upstream(target_table)
+        if not related_edges:
+            return []
+
+        source_tables = set(edge[0] for edge in related_edges)
+        target_tables = set(edge[1] for edge in related_edges)
+        return list(source_tables - target_tables)
+
+    def visualize_dag(
+        self,
+        filename: str = "dag_mermaid.html",
+        title: str = "DAG Visualization",
+        cluster_by_schema: bool = False,
+        table: Optional[str] = None,
+    ) -> None:
+        """
+        生成DAG图的 Mermaid.js HTML 文件并在浏览器中打开
+
+        Args:
+            filename: HTML文件路径
+            title: HTML页面标题
+            cluster_by_schema: 是否按库名分组展示
+            table: 只展示该表所在的连通分量，默认展示整个DAG
+        """
+        import webbrowser
+
+        if table is None:
+            self.dag.export(filename, "html", title=title, cluster_by_schema=cluster_by_schema)
+        else:
+            component = self.dag.component_of(table)
+            edges = self.dag.get_component_edges(component)
+            self.dag.export(filename, "html", edges, title=title, cluster_by_schema=cluster_by_schema)
+
+        # 获取绝对路径并打开
+        abs_path = os.path.abspath(filename)
+        webbrowser.open(f"file://{abs_path}")
+        print(f"Mermaid.js HTML文件已生成并打开: {abs_path}")
 
 
-def print_mermaid_dag(sql_stmt_str: str) -> None:
+def get_all_source_tables(sql_stmt_str: str) -> List[str]:
     """
-    打印SQL语句的DAG图（mermaid格式）
+    获取所有SQL语句中涉及的源表，包含了中间表
 
     Args:
         sql_stmt_str: SQL语句字符串
+
+    Returns:
+        源表列表
     """
-    sql_stmt_lst = SqlHelper.split(sql_stmt_str)
-    dg = _sql_to_dag(sql_stmt_lst)
-    dg.print_all_edges_to_mermaid()
+    return SqlCorpus(sql_stmt_str).get_all_source_tables()
+
+
+def pretty_print_lineage(sql_stmt_str: str) -> None:
+    SqlCorpus(sql_stmt_str).pretty_print_lineage()
 
 
-def _sql_to_dag(sql_stmt_lst: List[str]) -> DagGraph:
+def print_mermaid_dag(sql_stmt_str: str) -> None:
     """
-    将SQL语句列表转换为DAG图
+    打印SQL语句的DAG图（mermaid格式）
 
     Args:
-        sql_stmt_lst: SQL语句列表
-
-    Returns:
-        DAG图对象
+        sql_stmt_str: SQL语句字符串
     """
-    dg = DagGraph()
-    for sql_stmt in sql_stmt_lst:
-        table_info = SqlHelper().get_source_target_tables(sql_stmt)
-        if table_info:
-            target_tables = table_info["target_table"]
-            source_tables = table_info["source_table"]
-            for source_table in source_tables:
-                if target_tables:
-                    for target_table in target_tables:
-                        dg.add_edge(source_table.replace("`", ""), target_table.replace("`", ""))
-    return dg
+    SqlCorpus(sql_stmt_str).print_mermaid_dag()
 
 
-def _collect_tables(sql_stmt_str: str) -> Tuple[Set[str], Set[str]]:
+def _sql_to_dag(sql_stmt_str: str) -> DagGraph:
     """
-    收集SQL语句中的源表和目标表
+    将SQL脚本转换为DAG图
 
     Args:
         sql_stmt_str: SQL语句字符串
 
     Returns:
-        (源表集合, 目标表集合)
+        DAG图对象
     """
-    sql_stmt_lst = SqlHelper.split(sql_stmt_str)
-    source_tables = set()
-    target_tables = set()
-
-    for sql_stmt in sql_stmt_lst:
-        table_info = SqlHelper().get_source_target_tables(sql_stmt)
-        if table_info:
-            # 处理源表
-            for source_table in table_info["source_table"]:
-                source_tables.add(source_table.replace("`", ""))
-            # 处理目标表
-            for target_table in table_info["target_table"]:
-                target_tables.add(target_table.replace("`", ""))
-
-    return source_tables, target_tables
+    return SqlCorpus(sql_stmt_str).dag
 
 
 def get_root_tables(sql_stmt_str: str) -> List[str]:
@@ -161,8 +416,7 @@ def get_root_tables(sql_stmt_str: str) -> List[str]:
     Returns:
         根表列表
     """
-    source_tables, target_tables = _collect_tables(sql_stmt_str)
-    return list(source_tables - target_tables)
+    return SqlCorpus(sql_stmt_str).get_root_tables()
 
 
 def get_leaf_tables(sql_stmt_str: str) -> List[str]:
@@ -175,8 +429,7 @@ def get_leaf_tables(sql_stmt_str: str) -> List[str]:
     Returns:
         叶子表列表
     """
-    source_tables, target_tables = _collect_tables(sql_stmt_str)
-    return list(target_tables - source_tables)
+    return SqlCorpus(sql_stmt_str).get_leaf_tables()
 
 
 def print_related_edges_upstream(sql_stmt_str: str, target_table: str) -> None:
@@ -187,10 +440,7 @@ def print_related_edges_upstream(sql_stmt_str: str, target_table: str) -> None:
         sql_stmt_str: SQL语句字符串
         target_table: 目标表名
     """
-    sql_stmt_lst = SqlHelper.split(sql_stmt_str)
-    dg = _sql_to_dag(sql_stmt_lst)
-    related_edges = dg.find_related_edges_upstream(target_table)
-    dg.print_edges_to_mermaid(related_edges)
+    SqlCorpus(sql_stmt_str).print_related_edges_upstream(target_table)
 
 
 def get_related_first_source_tables_upstream(sql_stmt_str: str, target_table: str) -> List[str]:
@@ -204,16 +454,7 @@ def get_related_first_source_tables_upstream(sql_stmt_str: str, target_table: st
     Returns:
         第一层原始来源表列表
     """
-    # related_edges = _get_related_edges_forward(sql_stmt_str, target_table)
-    sql_stmt_lst = SqlHelper.split(sql_stmt_str)
-    dg = _sql_to_dag(sql_stmt_lst)
-    related_edges = dg.find_related_edges_upstream(target_table)
-    if not related_edges:
-        return []
-
-    source_tables = set(edge[0] for edge in related_edges)
-    target_tables = set(edge[1] for edge in related_edges)
-    return list(source_tables - target_tables)
+    return SqlCorpus(sql_stmt_str).get_related_first_source_tables_upstream(target_table)
 
 
 def print_related_edges_downstream(sql_stmt_str: str, target_table: str) -> None:
@@ -224,31 +465,20 @@ def print_related_edges_downstream(sql_stmt_str: str, target_table: str) -> None
         sql_stmt_str: SQL语句字符串
         target_table: 目标表名
     """
-    sql_stmt_lst = SqlHelper.split(sql_stmt_str)
-    dg = _sql_to_dag(sql_stmt_lst)
-    related_edges = dg.find_related_edges_downstream(target_table)
-    dg.print_edges_to_mermaid(related_edges)
+    SqlCorpus(sql_stmt_str).print_related_edges_downstream(target_table)
 
 
-def visualize_dag(sql_stmt_str: str, filename: str = "dag_mermaid.html", title: str = "DAG Visualization") -> None:
+def visualize_dag(
+    sql_stmt_str: str,
+    filename: str = "dag_mermaid.html",
+    title: str = "DAG Visualization",
+    table: Optional[str] = None,
+) -> None:
     """
     可视化DAG图
 
     Args:
         sql_stmt_str: SQL语句字符串
+        table: 只展示该表所在的连通分量
     """
-    import os
-    import webbrowser
-
-    sql_stmt_lst = SqlHelper.split(sql_stmt_str)
-    dg = _sql_to_dag(sql_stmt_lst)
-
-    html_content = dg.get_mermaidjs_dag(title)
-
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(html_content)
-
-    # 获取绝对路径并打开
-    abs_path = os.path.abspath(filename)
-    webbrowser.open(f"file://{abs_path}")
-    print(f"Mermaid.js HTML文件已生成并打开: {abs_path}")
+    SqlCorpus(sql_stmt_str).visualize_dag(filename, title, table=table)
@@ -0,0 +1,80 @@
+import pytest
+
+from src.cache import LineageCache
+from src.column_lineage import ColumnLineageExtractor
+from src.schema import SchemaCatalog
+
+
+def original_columns(extractor: ColumnLineageExtractor) -> list[list[str]]:
+    return [lineage["original_columns"] for lineage in extractor.column_lineage]
+
+
+@pytest.mark.parametrize(
+    "dialect, first, second",
+    [
+        # tsql 中 `#` 开头的是临时表名，不是注释
+        ("tsql", "insert into t select a.x from #a a", "insert into t select a.x from #b a"),
+        # hive 中 `\'` 是转义的单引号，其后的 `--` 仍在字符串内
+        (
+            "hive",
+            "insert into t select concat('a\\'--', s.b) as c from s",
+            "insert into t select concat('a\\'--', s.d) as c from s",
+        ),
+    ],
+)
+def test_cache_key_follows_dialect_tokens(dialect, first, second):
+    cache = LineageCache()
+    first_extractor = ColumnLineageExtractor(first, dialect, cache)
+    first_extractor.extract()
+    second_extractor = ColumnLineageExtractor(second, dialect, cache)
+    second_extractor.extract()
+
+    uncached = ColumnLineageExtractor(second, dialect)
+    uncached.extract()
+
+    assert cache.hits == 0
+    assert original_columns(second_extractor) == original_columns(uncached)
+    assert original_columns(second_extractor) != original_columns(first_extractor)
+
+
+def test_cache_key_shared_by_extract_and_iter_script():
+    cache = LineageCache()
+    sql = "insert into t select a.x, a.y from s a"
+    ColumnLineageExtractor(sql, "hive", cache).extract()
+
+    extractors = ColumnLineageExtractor.extract_script(f"{sql};\n{sql} -- 注释\n;", "hive", cache)
+
+    assert cache.hits == 2
+    assert [original_columns(extractor) for extractor in extractors] == [[["s.x"], ["s.y"]]] * 2
+
+
+def test_subclass_overrides_node_handler():
+    class SelectCounter(ColumnLineageExtractor):
+        selects = 0
+
+        def _handle_select_node(self, node):
+            SelectCounter.selects += 1
+            super()._handle_select_node(node)
+
+    extractor = SelectCounter("insert into t select a.x from (select s.x from s) a", "hive")
+    extractor.extract()
+
+    assert SelectCounter.selects == 2
+    assert original_columns(extractor) == [["s.x"]]
+    assert ColumnLineageExtractor._handler_cache is not SelectCounter._handler_cache
+
+
+def test_star_error_without_schema_catalog():
+    extractor = ColumnLineageExtractor("insert into t select * from s", "hive")
+
+    with pytest.raises(ValueError, match="未提供表结构目录"):
+        extractor.extract()
+
+
+def test_star_error_with_catalog_missing_table():
+    schema = SchemaCatalog("hive")
+    schema.add_table("db.other", ["x"])
+    extractor = ColumnLineageExtractor("insert into t select * from s", "hive", schema=schema)
+
+    with pytest.raises(ValueError, match="表结构目录中缺少来源表: s"):
+        extractor.extract()
@@ -0,0 +1,46 @@
+import pytest
+
+from src.graph import CycleDetectedException, DagGraph
+
+
+def test_rejected_self_loop_leaves_no_node():
+    dg = DagGraph(cycle_check="reject")
+    dg.add_edge("a", "b")
+
+    with pytest.raises(CycleDetectedException):
+        dg.add_edge("c", "c")
+
+    assert sorted(dg.get_nodes()) == ["a", "b"]
+
+
+def test_edge_from_new_node_keeps_topological_order():
+    dg = DagGraph(cycle_check="reject")
+    dg.add_edge("a", "b")
+    dg.add_edge("c", "a")
+
+    with pytest.raises(CycleDetectedException):
+        dg.add_edge("b", "c")
+    assert sorted(dg.get_edges()) == [("a", "b"), ("c", "a")]
+
+
+def test_frozen_graph_queries_match_dag_graph():
+    dg = DagGraph()
+    for _from, _to in [("ods.a", "dw.b"), ("ods.a", "dw.c"), ("dw.b", "dm.d"), ("dw.c", "dm.d"), ("x", "y"), ("y", "x")]:
+        dg.add_edge(_from, _to)
+    frozen = dg.freeze()
+
+    assert frozen.strongly_connected_components() == dg.strongly_connected_components()
+    assert frozen.weakly_connected_components() == dg.weakly_connected_components()
+    assert frozen.component_of("dm.d") == dg.component_of("dm.d")
+    assert frozen.get_component_edges(["ods.a", "dw.b"]) == dg.get_component_edges(["ods.a", "dw.b"])
+    assert frozen.is_upstream("ods.a", "dm.d") and not frozen.is_upstream("dm.d", "ods.a")
+    assert frozen.upstream_set("x") == dg.upstream_set("x") == {"x", "y"}
+    with pytest.raises(CycleDetectedException):
+        frozen.topological_order()
+
+    dg.remove_edge("y", "x")
+    frozen = dg.freeze()
+    weights = {"dw.c": 3.0}
+    assert frozen.topological_order() == dg.topological_order()
+    assert frozen.execution_levels() == dg.execution_levels()
+    assert frozen.critical_path(weights) == dg.critical_path(weights) == (["ods.a", "dw.c", "dm.d"], 5.0)
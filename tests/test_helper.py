@@ -0,0 +1,130 @@
+import random
+
+import pytest
+
+from src.helper import SqlHelper
+
+
+def reference_trim_comment(sql: str) -> str:
+    """逐字符实现的 trim_comment，作为对照"""
+    result = []
+    for line in sql.splitlines():
+        line = line.strip()
+        line = line if not line.startswith("--") else ""
+        line = line if not line.startswith("#") else ""
+        if len(line) == 0:
+            continue
+        has_terminated_double_quote = True
+        has_terminated_single_quote = True
+        was_pre_dash = False
+        index = 0
+        for char in line:
+            index += 1
+            match char:
+                case "'":
+                    if has_terminated_double_quote:
+                        has_terminated_single_quote = not has_terminated_single_quote
+                case '"':
+                    if has_terminated_single_quote:
+                        has_terminated_double_quote = not has_terminated_double_quote
+                case "-":
+                    if has_terminated_double_quote and has_terminated_single_quote:
+                        if was_pre_dash:
+                            line = line[: index - 2]
+                            continue
+                    was_pre_dash = True
+                case "#":
+                    if has_terminated_double_quote and has_terminated_single_quote:
+                        line = line[: index - 1]
+                        continue
+                case _:
+                    was_pre_dash = False
+        result.append(line)
+    sql = "\n".join(result)
+
+    sql = "\\n".join(sql.splitlines())
+
+    index = 0
+    depth = 0
+    has_terminated_double_quote = True
+    has_terminated_single_quote = True
+    was_pre_slash = False
+    was_pre_star = False
+    is_hint = False
+    comment_start_index = 0
+    comment_index_list = []
+    for char in sql:
+        index += 1
+        match char:
+            case "'":
+                if has_terminated_double_quote:
+                    has_terminated_single_quote = not has_terminated_single_quote
+            case '"':
+                if has_terminated_single_quote:
+                    has_terminated_double_quote = not has_terminated_double_quote
+            case "/":
+                if has_terminated_double_quote and has_terminated_single_quote:
+                    if was_pre_star:
+                        if not is_hint:
+                            depth -= 1
+                            if depth == 0:
+                                comment_index_list.append((comment_start_index, index))
+                        else:
+                            is_hint = False
+                was_pre_slash = True
+                was_pre_star = False
+            case "*":
+                if has_terminated_double_quote and has_terminated_single_quote:
+                    if was_pre_slash:
+                        depth += 1
+                        if depth == 1:
+                            comment_start_index = index - 2
+                was_pre_star = True
+                was_pre_slash = False
+            case "+":
+                if has_terminated_double_quote and has_terminated_single_quote:
+                    if was_pre_star and depth == 1:
+                        is_hint = True
+                        depth = 0
+                was_pre_star = False
+                was_pre_slash = False
+            case _:
+                was_pre_slash = False
+                was_pre_star = False
+    for start, end in reversed(comment_index_list):
+        sql = sql[:start] + sql[end:]
+    return sql.replace("\\n", "\n")
+
+
+TRIM_ATOMS = [
+    "select", " ", "  ", "\t", "a", "x", "-", "--", "#", "/", "*", "+", "'", '"', ";", "\n", "\r\n", "\r",
+    "/*", "*/", "/*+", "'a;b'", "-- c\n", "  -- whole\n", "/* n /* m */ k */", "/*+ hint */", "\\n", " ",
+]
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "select a  -- c\nfrom t",
+        "select a \t# c\nfrom t",
+        "'/*'/* c */",
+        "select 1 /* a */*/ b */",
+        "select /*+ hint */ a /* c */ from t",
+        "select 'a-'-x from t",
+        "select '-- not comment', \"# not\" from t -- c",
+        "/* a /* b */ c */ select 1",
+        "select 1 */ /* c */",
+        "select '\\n' from t",
+        "  \n-- whole\n# whole\nselect 1\n",
+    ],
+)
+def test_trim_comment_cases(sql):
+    assert SqlHelper().trim_comment(sql) == reference_trim_comment(sql)
+
+
+def test_trim_comment_random():
+    helper = SqlHelper()
+    for seed in range(5000):
+        rand = random.Random(seed)
+        sql = "".join(rand.choice(TRIM_ATOMS) for _ in range(rand.randint(0, 20)))
+        assert helper.trim_comment(sql) == reference_trim_comment(sql), repr(sql)
@@ -0,0 +1,16 @@
+from src.utils import SqlCorpus
+
+
+def test_add_sql_without_source_file_keeps_earlier_scripts():
+    corpus = SqlCorpus("insert into a select * from x; insert into b select * from y")
+    corpus.add_sql("insert into d select * from z")
+
+    assert [info["target_table"] for info in corpus.table_infos] == [["a"], ["b"], ["d"]]
+
+
+def test_add_sql_with_same_source_file_replaces_script():
+    corpus = SqlCorpus()
+    corpus.add_sql("insert into a select * from x", "job.sql")
+    corpus.add_sql("insert into d select * from z", "job.sql")
+
+    assert [info["target_table"] for info in corpus.table_infos] == [["d"]]